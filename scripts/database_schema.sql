@@ -136,6 +136,8 @@ CREATE INDEX idx_users_active ON users(is_active) WHERE is_active = TRUE;
 CREATE INDEX idx_daily_stats_date ON daily_stats(date);
 CREATE INDEX idx_daily_stats_province ON daily_stats(province_id);
 CREATE INDEX idx_daily_stats_date_province ON daily_stats(date, province_id);
+-- Per-province latest-date / gap lookups that skip forecast rows (data_quality_score = 0.7)
+CREATE INDEX idx_daily_stats_province_date_quality ON daily_stats(province_id, date, data_quality_score);
 
 CREATE INDEX idx_alerts_user ON alerts(user_id);
 CREATE INDEX idx_alerts_created ON alerts(created_at);
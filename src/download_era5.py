@@ -112,7 +112,7 @@ class ERA5Downloader:
         times = np.array([np.datetime64(date + timedelta(hours=h)) for h in [0, 6, 12, 18]])
         
         # Create realistic data based on seasonal patterns
-        rng = np.random.default_rng((abs(hash(date.date())) + 1234) % (2**32))
+        rng = np.random.default_rng(date.toordinal() * 1234 + 17)
         
         # Seasonal factors for Turkey
         month = date.month
@@ -424,7 +424,7 @@ class ERA5Downloader:
         times = np.array([np.datetime64(date + timedelta(hours=h)) for h in [0, 6, 12, 18]])
         
         # Create realistic data based on weather observations
-        rng = np.random.default_rng((abs(hash(date.date())) + 1234) % (2**32))
+        rng = np.random.default_rng(date.toordinal() * 1234 + 17)
         
         data_vars = {}
         
@@ -249,13 +249,24 @@ class DustForecastSystem:
             
             return forecast_data
     
-    def save_forecasts_to_database(self, forecast_data: List[Dict[str, Any]]) -> bool:
-        """Save forecast data to database"""
+    def save_forecasts_to_database(self, forecast_data: List[Dict[str, Any]], session=None) -> bool:
+        """
+        Save forecast data to database in a single transaction
+        session: caller's open session to write through (e.g. the orchestrator's), so the
+        batch commits on the connection already in use instead of opening a new one
+        """
         try:
-            with db_manager.get_session() as session:
-                db_manager.store_daily_stats(session, forecast_data)
-                logger.info(f"Saved {len(forecast_data)} forecast records to database")
-                return True
+            if session is not None:
+                try:
+                    db_manager.store_daily_stats(session, forecast_data)
+                except Exception:
+                    session.rollback()
+                    raise
+            else:
+                with db_manager.get_session() as session:
+                    db_manager.store_daily_stats(session, forecast_data)
+            logger.info(f"Saved {len(forecast_data)} forecast records to database")
+            return True
         except Exception as e:
             logger.error(f"Failed to save forecasts: {e}")
             return False
@@ -1,32 +1,169 @@
 import os
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, List, Optional
 import numpy as np
 import rasterio
-from rasterio.transform import from_origin
 from rasterio.warp import reproject, Resampling
 import xarray as xr
+import netCDF4
 import logging
-import threading
-import time
+import multiprocessing
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 try:
-    from rio_cogeo.profiles import cog_profiles
     from rio_cogeo.cogeo import cog_translate
 except Exception:
-    cog_profiles = None
     cog_translate = None
 
 from .download_cams import download_cams_dust_day
+from .raster_io import FLOAT32_COMPRESSION, TURKEY_BBOX, float32_cog_profile, target_grid, write_tiled
 from datetime import datetime, timedelta
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Reader for the direct NetCDF variable reads: "netcdf4" (default) or "h5netcdf"
+HDF_ENGINE = os.environ.get("COSMIC_HDF_ENGINE", "netcdf4").lower()
+
+
+def _as_2d(data: np.ndarray) -> np.ndarray:
+    """Squeeze single dimensions and take the first 2D slice of anything higher"""
+    data = np.squeeze(data)
+    if data.ndim > 2:
+        data = data[(0,) * (data.ndim - 2)]
+    return data
+
+
+def _open_netcdf(netcdf_path: str):
+    """Open a NetCDF file with the reader selected by COSMIC_HDF_ENGINE"""
+    if HDF_ENGINE == "h5netcdf":
+        import h5netcdf.legacyapi  # optional dependency
+        return h5netcdf.legacyapi.Dataset(netcdf_path, "r")
+    return netCDF4.Dataset(netcdf_path)
+
+
+def _read_variable(var, index=Ellipsis) -> np.ndarray:
+    """Read a variable as float64 with fill values set to NaN and CF scale/offset applied"""
+    raw = var[index]
+    if isinstance(raw, np.ma.MaskedArray):
+        # netCDF4 has already applied mask and scale
+        return np.ma.filled(raw.astype(np.float64), np.nan)
+    
+    raw = np.asarray(raw)
+    attrs = {name: var.getncattr(name) for name in var.ncattrs()}
+    values = raw.astype(np.float64)
+    for fill_attr in ('_FillValue', 'missing_value'):
+        if fill_attr in attrs:
+            values[raw == attrs[fill_attr]] = np.nan
+    values *= attrs.get('scale_factor', 1.0)
+    values += attrs.get('add_offset', 0.0)
+    return values
+
+
+def _do_process_cams(netcdf_path: str, target_res: float, debug: bool = False) -> Optional[np.ndarray]:
+    """
+    Read CAMS dust AOD and regrid it to the target grid
+    Runs inside the worker process started by process_cams_netcdf
+    """
+    logger.info("Opening NetCDF file...")
+    if debug:
+        # xarray is only used for diagnostics; listing names and sizes needs no CF decoding
+        with xr.open_dataset(netcdf_path, engine='netcdf4', decode_cf=False, cache=False) as ds:
+            logger.info(f"NetCDF variables: {list(ds.variables.keys())}")
+            logger.info(f"NetCDF dimensions: {dict(ds.sizes)}")
+    
+    # Read only the dust variable and its coordinates
+    nc = _open_netcdf(netcdf_path)
+    try:
+        # Get dust AOD variable (name may vary)
+        dust_var = None
+        possible_names = ['dust_aerosol_optical_depth_550nm', 'duaod550', 'aod550', 'od550dust']
+        for name in possible_names:
+            if name in nc.variables:
+                dust_var = name
+                logger.info(f"Found dust variable: {dust_var}")
+                break
+    
+        if dust_var is None:
+            logger.warning(f"No dust variable found in {netcdf_path}")
+            logger.warning(f"Available variables: {list(nc.variables.keys())}")
+            return None
+    
+        logger.info("Extracting dust data...")
+        # Get the latest time step (latest forecast)
+        v = nc.variables[dust_var]
+        index = tuple(-1 if dim == 'time' else slice(None) for dim in v.dimensions)
+        values = _read_variable(v, index)
+    
+        # Get coordinates - handle different naming conventions
+        lat_name = 'latitude' if 'latitude' in nc.variables else 'lat'
+        lon_name = 'longitude' if 'longitude' in nc.variables else 'lon'
+        logger.info(f"Using coordinate names: lat={lat_name}, lon={lon_name}")
+        lats = _read_variable(nc.variables[lat_name])
+        lons = _read_variable(nc.variables[lon_name])
+    finally:
+        nc.close()
+    
+    # Squeeze single dimensions and keep the first time/level slice
+    values = _as_2d(values)
+    logger.info(f"Dust data shape after squeeze: {values.shape}")
+    
+    logger.info(f"Coordinate ranges: lat={lats.min():.2f} to {lats.max():.2f}, lon={lons.min():.2f} to {lons.max():.2f}")
+    
+    # Target grid parameters
+    target_lons, target_lats, _ = target_grid(target_res)
+    
+    logger.info(f"Target grid: {len(target_lats)} x {len(target_lons)} points")
+    
+    logger.info("Performing interpolation...")
+    # Use numpy/scipy for much faster interpolation
+    from scipy.interpolate import RegularGridInterpolator
+    
+    # Create interpolator
+    points = (lats, lons)
+    
+    interpolator = RegularGridInterpolator(points, values, method='linear', bounds_error=False, fill_value=0)
+    
+    # Create target grid points
+    lon_grid, lat_grid = np.meshgrid(target_lons, target_lats)
+    target_points = np.column_stack([lat_grid.ravel(), lon_grid.ravel()])
+    
+    # Interpolate
+    regridded_values = interpolator(target_points).reshape(len(target_lats), len(target_lons))
+    
+    logger.info("Interpolation completed")
+    
+    logger.info("Converting to dust fraction...")
+    # Convert dust AOD to dust fraction (simplified)
+    # In reality, this would need total AOD from CAMS
+    dust_fraction = np.clip(regridded_values / 0.5, 0.0, 1.0)  # Assume max dust AOD of 0.5
+    
+    logger.info(f"Final dust fraction shape: {dust_fraction.shape}")
+    logger.info(f"Dust fraction range: {dust_fraction.min():.4f} to {dust_fraction.max():.4f}")
+    
+    return dust_fraction
+
+
+@lru_cache(maxsize=8)
+def _load_cams_array(netcdf_path: str, mtime: float, target_res: float, debug: bool,
+                     timeout_seconds: int) -> Optional[np.ndarray]:
+    """
+    Run _do_process_cams in a worker process, memoized on (path, mtime)
+    so a file used for both analysis and forecast is only read once
+    """
+    # Run processing in a worker process so a stuck read is killed on timeout
+    # (leaving the pool context terminates the worker); spawned rather than forked because
+    # the scheduler process has job, alert-loop and log-listener threads whose locks a fork would copy
+    with multiprocessing.get_context("spawn").Pool(processes=1) as pool:
+        async_result = pool.apply_async(_do_process_cams, (netcdf_path, target_res, debug))
+        dust_fraction = async_result.get(timeout_seconds)
+    
+    if dust_fraction is not None:
+        dust_fraction.setflags(write=False)  # Shared by every cache hit
+    return dust_fraction
 
-class TimeoutError(Exception):
-    pass
 
 def process_cams_netcdf(netcdf_path: str, target_params: dict, timeout_seconds: int = 120) -> np.ndarray:
     """
@@ -35,172 +172,50 @@ def process_cams_netcdf(netcdf_path: str, target_params: dict, timeout_seconds:
     """
     logger.info(f"Processing CAMS NetCDF: {netcdf_path}")
     
-    result = [None]
-    exception = [None]
-    
-    def process_netcdf():
-        try:
-            logger.info("Opening NetCDF file...")
-            # Read CAMS data with explicit engine
-            ds = xr.open_dataset(netcdf_path, engine='netcdf4')
-            
-            logger.info(f"NetCDF variables: {list(ds.variables.keys())}")
-            logger.info(f"NetCDF dimensions: {dict(ds.dims)}")
-            
-            # Get dust AOD variable (name may vary)
-            dust_var = None
-            possible_names = ['dust_aerosol_optical_depth_550nm', 'duaod550', 'aod550', 'od550dust']
-            for name in possible_names:
-                if name in ds.variables:
-                    dust_var = name
-                    logger.info(f"Found dust variable: {dust_var}")
-                    break
-            
-            if dust_var is None:
-                logger.warning(f"No dust variable found in {netcdf_path}")
-                logger.warning(f"Available variables: {list(ds.variables.keys())}")
-                result[0] = None
-                return
-            
-            logger.info("Extracting dust data...")
-            # Get the latest time step
-            dust_data = ds[dust_var]
-            if 'time' in dust_data.dims:
-                dust_data = dust_data.isel(time=-1)  # Latest forecast
-                logger.info("Selected latest time step")
-            
-            # Squeeze all single dimensions
-            dust_data = dust_data.squeeze()
-            logger.info(f"Dust data shape after squeeze: {dust_data.shape}")
-            
-            # Get coordinates - handle different naming conventions
-            lat_name = 'latitude' if 'latitude' in ds else 'lat'
-            lon_name = 'longitude' if 'longitude' in ds else 'lon'
-            logger.info(f"Using coordinate names: lat={lat_name}, lon={lon_name}")
-            
-            # Ensure we have 1D coordinate arrays
-            if lat_name in dust_data.coords:
-                lats = dust_data[lat_name].values
-            else:
-                lats = ds[lat_name].values
-                
-            if lon_name in dust_data.coords:
-                lons = dust_data[lon_name].values
-            else:
-                lons = ds[lon_name].values
-            
-            logger.info(f"Coordinate ranges: lat={lats.min():.2f} to {lats.max():.2f}, lon={lons.min():.2f} to {lons.max():.2f}")
-            
-            # Target grid parameters
-            target_res = float(target_params["project"]["target_resolution_deg"])
-            minx, miny, maxx, maxy = (25.0, 35.5, 45.0, 42.5)  # Turkey bbox
-            
-            # Create target grid
-            target_lons = np.arange(minx, maxx + target_res, target_res)
-            target_lats = np.arange(miny, maxy + target_res, target_res)[::-1]  # Flip for north-up
-            
-            logger.info(f"Target grid: {len(target_lats)} x {len(target_lons)} points")
-            
-            # Ensure dust_data has proper coordinates for interpolation
-            if lat_name not in dust_data.coords or lon_name not in dust_data.coords:
-                logger.info("Assigning coordinates to dust data...")
-                # Manually assign coordinates if missing
-                dust_data = dust_data.assign_coords({lat_name: lats, lon_name: lons})
-            
-            logger.info("Performing interpolation...")
-            # Use numpy/scipy for much faster interpolation
-            from scipy.interpolate import RegularGridInterpolator
-            
-            # Create interpolator
-            points = (lats, lons)
-            values = dust_data.values
-            
-            # Handle multi-dimensional data
-            if values.ndim > 2:
-                values = values[0]  # Take first time/level slice
-            
-            interpolator = RegularGridInterpolator(points, values, method='linear', bounds_error=False, fill_value=0)
-            
-            # Create target grid points
-            lon_grid, lat_grid = np.meshgrid(target_lons, target_lats)
-            target_points = np.column_stack([lat_grid.ravel(), lon_grid.ravel()])
-            
-            # Interpolate
-            regridded_values = interpolator(target_points).reshape(len(target_lats), len(target_lons))
-            
-            logger.info("Interpolation completed")
-            
-            logger.info("Converting to dust fraction...")
-            # Convert dust AOD to dust fraction (simplified)
-            # In reality, this would need total AOD from CAMS
-            dust_fraction = np.clip(regridded_values / 0.5, 0.0, 1.0)  # Assume max dust AOD of 0.5
-            
-            # Ensure we have exactly 2D array
-            while dust_fraction.ndim > 2:
-                dust_fraction = dust_fraction.squeeze()
-            
-            # If still not 2D, take the first slice
-            if dust_fraction.ndim > 2:
-                dust_fraction = dust_fraction[0]
-            elif dust_fraction.ndim < 2:
-                raise ValueError(f"Dust fraction has unexpected shape: {dust_fraction.shape}")
-            
-            logger.info(f"Final dust fraction shape: {dust_fraction.shape}")
-            logger.info(f"Dust fraction range: {dust_fraction.min():.4f} to {dust_fraction.max():.4f}")
-            
-            ds.close()
-            result[0] = dust_fraction
-            
-        except Exception as e:
-            logger.error(f"Error processing CAMS NetCDF: {e}")
-            logger.error(f"Error type: {type(e).__name__}")
-            exception[0] = e
-    
-    # Run processing in a separate thread with timeout
-    thread = threading.Thread(target=process_netcdf)
-    thread.daemon = True
-    thread.start()
-    thread.join(timeout_seconds)
-    
-    if thread.is_alive():
+    target_res = float(target_params["project"]["target_resolution_deg"])
+    debug = bool(target_params.get("runtime", {}).get("debug", False))
+    try:
+        return _load_cams_array(netcdf_path, os.path.getmtime(netcdf_path), target_res, debug, timeout_seconds)
+    except multiprocessing.TimeoutError:
         logger.error(f"CAMS NetCDF processing timed out after {timeout_seconds} seconds")
         return None
-    
-    if exception[0] is not None:
-        raise exception[0]
-    
-    return result[0]
+    except Exception as e:
+        logger.error(f"Error processing CAMS NetCDF: {e}")
+        logger.error(f"Error type: {type(e).__name__}")
+        raise
 
 
 def create_synthetic_dust_fraction(target_params: dict, utc_date: datetime) -> np.ndarray:
     """Create synthetic dust fraction with realistic patterns"""
     res = float(target_params["project"]["target_resolution_deg"])
-    minx, miny, maxx, maxy = (25.0, 35.5, 45.0, 42.5)
+    minx, miny, maxx, maxy = TURKEY_BBOX
     width = int((maxx - minx) / res)
     height = int((maxy - miny) / res)
 
     # Use date-dependent seed for consistency
-    rng = np.random.default_rng((abs(hash(utc_date.date())) + 1337) % (2**32))
+    rng = np.random.default_rng(utc_date.toordinal() * 1337 + 17)
     
     # Create realistic dust patterns
     # Higher dust activity in south and east (towards Syria/Iraq)
-    lat_grid = np.linspace(maxy, miny, height)
-    lon_grid = np.linspace(minx, maxx, width)
-    
-    lat_mesh, lon_mesh = np.meshgrid(lat_grid, lon_grid, indexing='ij')
+    # 1D column/row vectors broadcast against each other instead of a meshgrid
+    lat = np.linspace(maxy, miny, height, dtype=np.float32)[:, None]
+    lon = np.linspace(minx, maxx, width, dtype=np.float32)[None, :]
     
-    # Base dust fraction (higher in southeast)
-    base_dust = 0.1 + 0.4 * (1 - (lat_mesh - miny) / (maxy - miny))  # Higher in south
-    base_dust += 0.3 * ((lon_mesh - minx) / (maxx - minx))  # Higher in east
+    # Base dust fraction (higher in southeast), built in place on one float32 grid
+    dust_fraction = np.empty((height, width), dtype=np.float32)
+    dust_fraction[:] = 0.1 + 0.4 * (1 - (lat - miny) / (maxy - miny))  # Higher in south
+    dust_fraction += 0.3 * ((lon - minx) / (maxx - minx))  # Higher in east
     
     # Add seasonal variation (higher in spring/summer)
     month = utc_date.month
     seasonal_factor = 0.8 + 0.4 * np.sin((month - 3) * np.pi / 6)  # Peak in June
-    base_dust *= seasonal_factor
+    dust_fraction *= seasonal_factor
     
-    # Add random variability
-    noise = rng.beta(2.0, 5.0, size=(height, width)) * 0.3
-    dust_fraction = np.clip(base_dust + noise, 0.0, 1.0)
+    # Add random variability (Generator.beta only draws float64; it is added into the float32 grid)
+    noise = rng.beta(2.0, 5.0, size=(height, width))
+    noise *= 0.3
+    dust_fraction += noise
+    np.clip(dust_fraction, 0.0, 1.0, out=dust_fraction)
     
     return dust_fraction
 
@@ -361,25 +376,41 @@ def ingest_cams_dust_day(utc_date: datetime, params: dict) -> Dict[str, str]:
     return results
 
 
+def ingest_cams_range(dates: List[datetime], params: dict, max_workers: Optional[int] = None) -> Dict[str, Dict[str, str]]:
+    """
+    Run ingest_cams_dust_day for several dates in parallel worker processes
+    netCDF4/HDF5 is not thread-safe, so each date gets its own process
+    Returns dict mapping ISO date to that day's raster paths
+    """
+    if max_workers is None:
+        max_workers = params.get("runtime", {}).get("threads")
+    
+    results = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(ingest_cams_dust_day, date, params): date for date in dates}
+        # Rasters are written by the workers; only paths come back as days finish
+        for future in as_completed(futures):
+            date = futures[future]
+            try:
+                results[date.date().isoformat()] = future.result()
+            except Exception as e:
+                logger.error(f"CAMS ingestion failed for {date.date()}: {e}")
+    
+    return results
+
+
 def _save_dust_raster(dust_data: np.ndarray, date: datetime, data_type: str, params: dict) -> str:
     """Save dust fraction data to GeoTIFF"""
     res = float(params["project"]["target_resolution_deg"])
-    minx, miny, maxx, maxy = (25.0, 35.5, 45.0, 42.5)
-    transform = from_origin(minx, maxy, res, res)
+    _, _, transform = target_grid(res)
     
     out_path = os.path.join(
         params["paths"]["derived_dir"],
         f"cams_dustfrac_{data_type}_{date.date().isoformat()}.tif",
     )
     
-    # Ensure we have a 2D array
-    while dust_data.ndim > 2:
-        dust_data = dust_data.squeeze()
-    
-    if dust_data.ndim > 2:
-        # If still > 2D after squeeze, take the first 2D slice
-        dust_data = dust_data[0]
-        print(f"Warning: Dust data had {dust_data.ndim} dimensions, taking first 2D slice")
+    # Ensure we have a C-contiguous float32 2D array
+    dust_data = np.ascontiguousarray(_as_2d(dust_data), dtype=np.float32)
     
     if dust_data.ndim != 2:
         raise ValueError(f"Cannot save dust raster: expected 2D array, got shape {dust_data.shape}")
@@ -393,20 +424,20 @@ def _save_dust_raster(dust_data: np.ndarray, date: datetime, data_type: str, par
         "dtype": rasterio.float32,
         "crs": params["project"]["crs"],
         "transform": transform,
-        "compress": "DEFLATE",
+        **FLOAT32_COMPRESSION,
         "tiled": True,
         "blockxsize": 256,
         "blockysize": 256,
     }
     
     with rasterio.open(out_path, "w", **profile) as dst:
-        dst.write(dust_data.astype(np.float32), 1)
+        write_tiled(dst, dust_data, 1)
 
     # Create COG if requested
     if params.get("runtime", {}).get("write_cog", False) and cog_translate is not None:
         cog_path = out_path.replace(".tif", ".cog.tif")
         config = dict(GDAL_TIFF_OVR_BLOCKSIZE="256")
-        cog_profile = cog_profiles.get("deflate") if cog_profiles else None
+        cog_profile = float32_cog_profile()
         cog_translate(out_path, cog_path, cog_profile, config=config, in_memory=False)
         return cog_path
 
@@ -1,173 +1,266 @@
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, Optional
 import numpy as np
 import rasterio
-from rasterio.transform import from_origin
 import xarray as xr
+import netCDF4
 from .download_era5 import download_era5_day
+from .raster_io import FLOAT32_COMPRESSION, SOURCE_TAG, TURKEY_BBOX, is_synthetic_output, target_grid, write_tiled
+
+
+# Scratch buffers for synthetic noise, keyed by grid shape
+_NOISE_BUFFERS = {}
+
+# Time axis names: 'time' in the legacy CDS format, 'valid_time' in the current one
+_TIME_DIMS = ('time', 'valid_time')
+
+# Non-spatial dims besides time that CDS may add to a single-level request
+_EXTRA_DIMS = ('expver', 'level', 'pressure_level', 'number')
+
+
+def _read_daily_mean(nc: netCDF4.Dataset, name: str) -> np.ndarray:
+    """Read one variable and average it over the time axis (daily mean)"""
+    var = nc.variables[name]
+    # Stray ensemble/level/experiment-version dims are reduced to their first entry
+    # as part of the read, so every slab comes back as a 2D lat/lon field
+    base_index = tuple(0 if dim in _EXTRA_DIMS else slice(None) for dim in var.dimensions)
+    time_dims = [dim for dim in var.dimensions if dim in _TIME_DIMS]
+    if not time_dims:
+        values = np.ma.filled(var[base_index].astype(np.float32, copy=False), np.nan)
+    else:
+        # Stream the mean one time step at a time (float32 accumulator) so only
+        # a single slab is resident, instead of the whole hourly stack
+        time_axis = var.dimensions.index(time_dims[0])
+        total = None
+        for t in range(var.shape[time_axis]):
+            index = base_index[:time_axis] + (t,) + base_index[time_axis + 1:]
+            slab = np.ma.filled(var[index].astype(np.float32, copy=False), np.nan)
+            valid = ~np.isnan(slab)
+            if total is None:
+                total = np.zeros(slab.shape, dtype=np.float32)
+                count = np.zeros(slab.shape, dtype=np.int32)
+            np.add(total, slab, out=total, where=valid)
+            count += valid
+        values = np.full(total.shape, np.nan, dtype=np.float32)
+        np.divide(total, count, out=values, where=count > 0)
+    
+    if values.ndim != 2:
+        raise ValueError(f"ERA5 variable {name} has unexpected dimensions {var.dimensions}")
+    return values
+
+
+def _axis_weights(src: np.ndarray, tgt: np.ndarray) -> tuple:
+    """
+    Bracketing source indices and linear weight of each target coordinate along one axis
+    Source coordinates may be ascending or descending; targets outside get a NaN weight
+    """
+    ascending = src[-1] >= src[0]
+    coords = src if ascending else src[::-1]
+    idx = np.clip(np.searchsorted(coords, tgt, side='right') - 1, 0, len(coords) - 2)
+    weight = ((tgt - coords[idx]) / (coords[idx + 1] - coords[idx])).astype(np.float32)
+    weight[(tgt < coords[0]) | (tgt > coords[-1])] = np.nan
+    
+    lower = idx.astype(np.int32)
+    if not ascending:
+        lower = len(coords) - 1 - lower  # Map back to the original (descending) order
+        return lower, lower - 1, weight
+    return lower, lower + 1, weight
+
+
+def _build_bilinear_weights(src_lats: np.ndarray, src_lons: np.ndarray,
+                            tgt_lats: np.ndarray, tgt_lons: np.ndarray) -> tuple:
+    """Separable bilinear weights (i0, i1, j0, j1, wy, wx) from the source to the target grid"""
+    i0, i1, wy = _axis_weights(np.asarray(src_lats), np.asarray(tgt_lats))
+    j0, j1, wx = _axis_weights(np.asarray(src_lons), np.asarray(tgt_lons))
+    return i0, i1, j0, j1, wy, wx
+
+
+@lru_cache(maxsize=8)
+def _cached_bilinear_weights(src_lats: tuple, src_lons: tuple, target_res: float) -> tuple:
+    """
+    _build_bilinear_weights onto target_grid(target_res), cached across files and days
+    Source coordinates are passed as tuples so they can key the cache; arrays are read-only
+    """
+    target_lons, target_lats, _ = target_grid(target_res)
+    weights = _build_bilinear_weights(np.array(src_lats), np.array(src_lons), target_lats, target_lons)
+    for arr in weights:
+        arr.setflags(write=False)
+    return weights
+
+
+def _apply_bilinear(values: np.ndarray, weights: tuple) -> np.ndarray:
+    """
+    Regrid a 2D source field, or a (V, H, W) stack of fields, with precomputed weights
+    (NaN outside the source grid)
+    """
+    i0, i1, j0, j1, wy, wx = weights
+    wy = wy[:, None]
+    wx = wx[None, :]
+    rows0 = values[..., i0, :]
+    rows1 = values[..., i1, :]
+    top = rows0[..., j0] * (1 - wx) + rows0[..., j1] * wx
+    bottom = rows1[..., j0] * (1 - wx) + rows1[..., j1] * wx
+    return top * (1 - wy) + bottom * wy
 
 
 def process_era5_netcdf(netcdf_path: str, params: dict) -> dict:
     """Process ERA5 NetCDF file and extract RH/BLH on target grid"""
     try:
-        ds = xr.open_dataset(netcdf_path)
+        if params.get("runtime", {}).get("debug", False):
+            # xarray is only used for diagnostics; listing names and sizes needs no CF decoding
+            with xr.open_dataset(netcdf_path, engine='netcdf4', decode_cf=False, cache=False) as ds:
+                print(f"ERA5 variables: {list(ds.variables.keys())}")
+                print(f"ERA5 dimensions: {dict(ds.sizes)}")
         
         # Target grid parameters
         target_res = float(params["project"]["target_resolution_deg"])
-        minx, miny, maxx, maxy = (25.0, 35.5, 45.0, 42.5)
-        
-        # Create target grid
-        target_lons = np.arange(minx, maxx + target_res, target_res)
-        target_lats = np.arange(miny, maxy + target_res, target_res)[::-1]
         
-        results = {}
+        # Source fields on the ERA5 grid, regridded together once all are read
+        fields = {}
         
-        # Relative humidity: handle common CDS names or calculate from temperature and dewpoint
-        rh_var = None
-        for name in ['relative_humidity', 'r', '2m_relative_humidity']:
-            if name in ds.variables:
-                rh_var = name
-                break
-        
-        if rh_var is not None:
-            rh_data = ds[rh_var]
-            if 'time' in rh_data.dims:
-                rh_data = rh_data.mean(dim='time')  # Daily average
-            
-            # Interpolate to target grid
-            rh_regridded = rh_data.interp(
-                latitude=target_lats,
-                longitude=target_lons,
-                method='linear'
-            )
-            results['rh'] = rh_regridded.values
-        else:
-            # Calculate relative humidity from temperature and dewpoint
-            temp_var = None
-            dewpoint_var = None
+        nc = netCDF4.Dataset(netcdf_path)
+        try:
+            lats = np.asarray(nc.variables['latitude'][:])
+            lons = np.asarray(nc.variables['longitude'][:])
             
-            for name in ['2m_temperature', 't2m', 'temperature']:
-                if name in ds.variables:
-                    temp_var = name
-                    break
+            # Interpolation weights are shared by every variable in the file and, for the
+            # same source grid, by every later file
+            weights = _cached_bilinear_weights(tuple(lats.tolist()), tuple(lons.tolist()), target_res)
             
-            for name in ['2m_dewpoint_temperature', 'd2m', 'dewpoint']:
-                if name in ds.variables:
-                    dewpoint_var = name
+            # Relative humidity: handle common CDS names or calculate from temperature and dewpoint
+            rh_var = None
+            for name in ['relative_humidity', 'r', '2m_relative_humidity']:
+                if name in nc.variables:
+                    rh_var = name
                     break
             
-            if temp_var is not None and dewpoint_var is not None:
-                print(f"Calculating relative humidity from {temp_var} and {dewpoint_var}")
-                temp_data = ds[temp_var]
-                dewpoint_data = ds[dewpoint_var]
-                
-                if 'time' in temp_data.dims:
-                    temp_data = temp_data.mean(dim='time')
-                if 'time' in dewpoint_data.dims:
-                    dewpoint_data = dewpoint_data.mean(dim='time')
-                
-                # Convert from Kelvin to Celsius
-                temp_c = temp_data - 273.15
-                dewpoint_c = dewpoint_data - 273.15
+            if rh_var is not None:
+                fields['rh'] = _read_daily_mean(nc, rh_var)
+            else:
+                # Calculate relative humidity from temperature and dewpoint
+                temp_var = None
+                dewpoint_var = None
                 
-                # Calculate relative humidity using Magnus formula
-                # RH = 100 * exp((17.625 * Td) / (243.04 + Td)) / exp((17.625 * T) / (243.04 + T))
-                rh = 100 * np.exp((17.625 * dewpoint_c) / (243.04 + dewpoint_c)) / np.exp((17.625 * temp_c) / (243.04 + temp_c))
+                for name in ['2m_temperature', 't2m', 'temperature']:
+                    if name in nc.variables:
+                        temp_var = name
+                        break
                 
-                # Interpolate to target grid
-                rh_regridded = rh.interp(
-                    latitude=target_lats,
-                    longitude=target_lons,
-                    method='linear'
-                )
-                results['rh'] = rh_regridded.values
+                for name in ['2m_dewpoint_temperature', 'd2m', 'dewpoint']:
+                    if name in nc.variables:
+                        dewpoint_var = name
+                        break
                 
-                # Flatten to 2D if needed
-                if len(results['rh'].shape) > 2:
-                    results['rh'] = results['rh'].squeeze()
-                    # If still not 2D, take the first slice
-                    if len(results['rh'].shape) > 2:
-                        results['rh'] = results['rh'][0]
-            else:
-                print("Warning: No temperature/dewpoint data found for RH calculation")
-        
-        # Boundary layer height: handle common CDS names
-        blh_var = None
-        for name in ['boundary_layer_height', 'blh']:
-            if name in ds.variables:
-                blh_var = name
-                break
-        if blh_var is not None:
-            blh_data = ds[blh_var]
-            if 'time' in blh_data.dims:
-                blh_data = blh_data.mean(dim='time')  # Daily average
+                if temp_var is not None and dewpoint_var is not None:
+                    print(f"Calculating relative humidity from {temp_var} and {dewpoint_var}")
+                    
+                    # Convert from Kelvin to Celsius
+                    temp_c = _read_daily_mean(nc, temp_var) - 273.15
+                    dewpoint_c = _read_daily_mean(nc, dewpoint_var) - 273.15
+                    
+                    # Calculate relative humidity using Magnus formula
+                    # RH = 100 * exp((17.625 * Td) / (243.04 + Td)) / exp((17.625 * T) / (243.04 + T))
+                    #    = 100 * exp(a - b), one exp per cell instead of two plus a divide
+                    a = (17.625 * dewpoint_c) / (243.04 + dewpoint_c)
+                    b = (17.625 * temp_c) / (243.04 + temp_c)
+                    a -= b
+                    rh = np.exp(a, out=a)
+                    rh *= 100.0
+                    
+                    fields['rh'] = rh
+                else:
+                    print("Warning: No temperature/dewpoint data found for RH calculation")
             
-            # Interpolate to target grid
-            blh_regridded = blh_data.interp(
-                latitude=target_lats,
-                longitude=target_lons,
-                method='linear'
-            )
-            results['blh'] = blh_regridded.values
-            
-            # Flatten to 2D if needed
-            if len(results['blh'].shape) > 2:
-                results['blh'] = results['blh'].squeeze()
-                # If still not 2D, take the first slice
-                if len(results['blh'].shape) > 2:
-                    results['blh'] = results['blh'][0]
+            # Boundary layer height: handle common CDS names
+            blh_var = None
+            for name in ['boundary_layer_height', 'blh']:
+                if name in nc.variables:
+                    blh_var = name
+                    break
+            if blh_var is not None:
+                fields['blh'] = _read_daily_mean(nc, blh_var)
+        finally:
+            nc.close()
+        
+        if not fields:
+            return {}
         
-        ds.close()
-        return results
+        # One gather/blend pass over the stacked (V, H, W) fields
+        names = list(fields)
+        regridded = _apply_bilinear(np.stack([fields[name] for name in names]), weights)
+        return dict(zip(names, regridded))
         
     except Exception as e:
         print(f"Error processing ERA5 NetCDF: {e}")
         return {}
 
 
+def _noise_buffer(shape: tuple) -> np.ndarray:
+    """Return the float32 noise buffer for a grid shape, reused across days"""
+    buffer = _NOISE_BUFFERS.get(shape)
+    if buffer is None:
+        buffer = _NOISE_BUFFERS[shape] = np.empty(shape, dtype=np.float32)
+    return buffer
+
+
 def create_synthetic_era5(utc_date: datetime, params: dict) -> dict:
     """Create synthetic ERA5 data with realistic patterns"""
     res = float(params["project"]["target_resolution_deg"])
-    minx, miny, maxx, maxy = (25.0, 35.5, 45.0, 42.5)
+    minx, miny, maxx, maxy = TURKEY_BBOX
     width = int((maxx - minx) / res)
     height = int((maxy - miny) / res)
 
-    rng = np.random.default_rng((abs(hash(utc_date.date())) + 4242) % (2**32))
+    rng = np.random.default_rng(utc_date.toordinal() * 4242 + 17)
     
-    # Create coordinate grids
-    lat_coords = np.linspace(maxy, miny, height)
-    lon_coords = np.linspace(minx, maxx, width)
-    lat_grid, lon_grid = np.meshgrid(lat_coords, lon_coords, indexing='ij')
+    # Create coordinate vectors (broadcast as column/row instead of a meshgrid);
+    # float32 throughout so the fields need no final conversion copy
+    lat = np.linspace(maxy, miny, height, dtype=np.float32)[:, None]
+    lon = np.linspace(minx, maxx, width, dtype=np.float32)[None, :]
     
     # Relative humidity with realistic patterns
     # Higher near coasts, lower inland, seasonal variation
-    coastal_dist_west = np.abs(lon_grid - 25.0)  # Distance from western coast
-    coastal_dist_south = np.abs(lat_grid - 35.5)  # Distance from southern coast
-    coastal_effect = np.maximum(0, 20 - np.minimum(coastal_dist_west * 3, coastal_dist_south * 4))
-    
-    base_rh = 45 + coastal_effect
+    # Coastal distances are weighted on the row/column vectors; the single H x W
+    # array is created by the fmin broadcast and everything after runs in place
+    coastal_dist_west = np.abs(lon - np.float32(25.0))  # Distance from western coast
+    coastal_dist_south = np.abs(lat - np.float32(35.5))  # Distance from southern coast
+    coastal_dist_west *= 3
+    coastal_dist_south *= 4
+    rh = np.fmin(coastal_dist_west, coastal_dist_south)
+    np.subtract(20, rh, out=rh)
+    np.fmax(rh, 0, out=rh)  # Coastal effect
+    rh += 45  # Base RH
     
     # Add seasonal variation
     month = utc_date.month
     seasonal_rh = 10 * np.sin((month - 1) * np.pi / 6)  # Winter higher, summer lower
+    rh += seasonal_rh
     
-    # Add daily noise
-    rh_noise = rng.normal(0, 5, size=(height, width))
-    rh = np.clip(base_rh + seasonal_rh + rh_noise, 10.0, 95.0)
+    # Add daily noise (drawn in float32 into a reused buffer)
+    noise = _noise_buffer((height, width))
+    rng.standard_normal(dtype=np.float32, out=noise)
+    noise *= 5.0
+    rh += noise
+    np.clip(rh, 10.0, 95.0, out=rh)
     
     # Boundary layer height (higher inland, daytime peak)
     # Lower near mountains, higher in plains
-    elevation_proxy = (lat_grid - 35.5) * 200  # Rough elevation increase northward
-    base_blh = 800 + (lon_grid - 25.0) * 15 - elevation_proxy  # Higher inland, lower at altitude
+    elevation_proxy = (lat - 35.5) * 200  # Rough elevation increase northward
+    blh = (800 + (lon - 25.0) * 15) - elevation_proxy  # Higher inland, lower at altitude
     
     # Add seasonal and daily variation
     seasonal_blh = 200 * np.sin((month - 3) * np.pi / 6)  # Peak in summer
-    blh_noise = rng.normal(0, 100, size=(height, width))
-    blh = np.clip(base_blh + seasonal_blh + blh_noise, 200.0, 2500.0)
+    blh += seasonal_blh
+    rng.standard_normal(dtype=np.float32, out=noise)
+    noise *= 100.0
+    blh += noise
+    np.clip(blh, 200.0, 2500.0, out=blh)
     
     return {
-        'rh': rh.astype(np.float32),
-        'blh': blh.astype(np.float32)
+        'rh': rh,
+        'blh': blh
     }
 
 
@@ -190,8 +283,18 @@ def ingest_era5_day(utc_date: datetime, params: dict) -> dict:
     out_dir = params["paths"]["derived_dir"]
     os.makedirs(out_dir, exist_ok=True)
     
+    # Reuse a previous run's output for this date unless asked to overwrite; a synthetic one
+    # only while the date is still too recent for real data, so real ERA5 replaces it later
+    combined_path = os.path.join(out_dir, f"era5_meteo_{utc_date.date().isoformat()}.tif")
+    era5_available = is_date_available_for_era5(utc_date)
+    if (os.path.exists(combined_path) and not params.get("runtime", {}).get("overwrite", False)
+            and (not era5_available or not is_synthetic_output(combined_path))):
+        print(f"Using existing ERA5 output: {combined_path}")
+        return {"combined": combined_path}
+    
     # Check if date is too recent for real data
-    if not is_date_available_for_era5(utc_date):
+    source = "synthetic"
+    if not era5_available:
         days_ago = (datetime.utcnow() - utc_date).days
         print(f"Date {utc_date.date()} is too recent ({days_ago} days ago) for ERA5 final data")
         print("Using synthetic meteorological data instead...")
@@ -206,6 +309,7 @@ def ingest_era5_day(utc_date: datetime, params: dict) -> dict:
             era5_data = process_era5_netcdf(era5_file, params)
             if era5_data:
                 print("Processed real ERA5 data")
+                source = "real"
             else:
                 print("ERA5 processing failed, using synthetic")
                 era5_data = create_synthetic_era5(utc_date, params)
@@ -213,13 +317,9 @@ def ingest_era5_day(utc_date: datetime, params: dict) -> dict:
             print(f"ERA5 download/processing failed: {e}")
             era5_data = create_synthetic_era5(utc_date, params)
     
-    # Save to GeoTIFF files
+    # Save to a 2-band GeoTIFF (band 1: RH, band 2: BLH)
     res = float(params["project"]["target_resolution_deg"])
-    minx, miny, maxx, maxy = (25.0, 35.5, 45.0, 42.5)
-    transform = from_origin(minx, maxy, res, res)
-    
-    rh_path = os.path.join(out_dir, f"era5_rh_{utc_date.date().isoformat()}.tif")
-    blh_path = os.path.join(out_dir, f"era5_blh_{utc_date.date().isoformat()}.tif")
+    _, _, transform = target_grid(res)
     
     # Get data arrays
     rh_data = era5_data.get('rh')
@@ -231,30 +331,55 @@ def ingest_era5_day(utc_date: datetime, params: dict) -> dict:
         synthetic = create_synthetic_era5(utc_date, params)
         rh_data = synthetic['rh']
         blh_data = synthetic['blh']
+        source = "synthetic"
     
     height, width = rh_data.shape[-2:]  # Get last 2 dimensions
     profile = {
         "driver": "GTiff",
         "height": height,
         "width": width,
-        "count": 1,
+        "count": 2,
         "dtype": rasterio.float32,
         "crs": params["project"]["crs"],
         "transform": transform,
-        "compress": "DEFLATE",
+        **FLOAT32_COMPRESSION,
         "tiled": True,
         "blockxsize": 256,
         "blockysize": 256,
     }
     
-    # Save RH
-    with rasterio.open(rh_path, "w", **profile) as dst:
-        dst.write(rh_data, 1)
-    
-    # Save BLH
-    with rasterio.open(blh_path, "w", **profile) as dst:
-        dst.write(blh_data, 1)
+    with rasterio.open(combined_path, "w", **profile) as dst:
+        write_tiled(dst, rh_data, 1)
+        write_tiled(dst, blh_data, 2)
+        dst.update_tags(**{SOURCE_TAG: source})
+        dst.update_tags(1, name="rh")
+        dst.update_tags(2, name="blh")
+        dst.set_band_description(1, "rh")
+        dst.set_band_description(2, "blh")
 
-    return {"rh": rh_path, "blh": blh_path}
+    return {"combined": combined_path}
+
+
+def ingest_era5_range(dates: List[datetime], params: dict, max_workers: Optional[int] = None) -> Dict[str, dict]:
+    """
+    Run ingest_era5_day for several dates in parallel worker processes
+    netCDF4/HDF5 is not thread-safe, so each date gets its own process
+    Returns dict mapping ISO date to that day's raster paths
+    """
+    if max_workers is None:
+        max_workers = params.get("runtime", {}).get("threads")
+    
+    results = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(ingest_era5_day, date, params): date for date in dates}
+        # Rasters are written by the workers; only paths come back as days finish
+        for future in as_completed(futures):
+            date = futures[future]
+            try:
+                results[date.date().isoformat()] = future.result()
+            except Exception as e:
+                print(f"ERA5 ingestion failed for {date.date()}: {e}")
+    
+    return results
 
 
@@ -1,4 +1,5 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Optional, List, Dict
 import numpy as np
@@ -18,13 +19,19 @@ except ImportError:
     HDF_AVAILABLE = False
 
 try:
-    from rio_cogeo.profiles import cog_profiles
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    # Optional JIT for swath binning; NumPy fallback is used without it
+    NUMBA_AVAILABLE = False
+
+try:
     from rio_cogeo.cogeo import cog_translate
 except Exception:
-    cog_profiles = None
     cog_translate = None
 
 from .download_modis import download_modis_aod_day
+from .raster_io import FLOAT32_COMPRESSION, SOURCE_TAG, float32_cog_profile, is_synthetic_output, write_tiled
 
 
 def _ensure_dirs(params: dict) -> None:
@@ -57,17 +64,17 @@ def read_modis_hdf(hdf_path: str) -> Dict[str, np.ndarray]:
         add_offset = aod_attrs.get('add_offset', 0.0)
         fill_value = aod_attrs.get('_FillValue', -9999)
         
-        # Mask invalid data
-        valid_mask = (aod_data != fill_value) & (aod_data > -1000)
-        aod_data = aod_data.astype(np.float32) * scale_factor + add_offset
+        # Mask invalid data and apply QC filtering (keep good and marginal quality)
+        # QC bits: 0-2 for confidence (<= 1: high and moderate), 3+ for other flags
+        qc8 = qc_data.astype(np.uint8, copy=False)
+        final_mask = (aod_data != fill_value) & (aod_data > -1000) & ((qc8 & np.uint8(0x07)) <= np.uint8(1))
         
-        # Apply QC filtering (keep good and marginal quality)
-        # QC bits: 0-2 for confidence, 3+ for other flags
-        qc_confidence = qc_data & 0x07  # Extract bits 0-2
-        good_qc = (qc_confidence <= 1)  # High and moderate confidence
-        
-        final_mask = valid_mask & good_qc
-        aod_data[~final_mask] = np.nan
+        # Scale in place (float32 scalars keep the arithmetic in float32) and blank
+        # everything outside the mask in one pass
+        scaled = aod_data.astype(np.float32)
+        scaled *= np.float32(scale_factor)
+        scaled += np.float32(add_offset)
+        aod_data = np.where(final_mask, scaled, np.float32(np.nan))
         
         # Read geolocation if available
         try:
@@ -94,6 +101,39 @@ def read_modis_hdf(hdf_path: str) -> Dict[str, np.ndarray]:
         return None
 
 
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def _bin_sum_count(lat, lon, aod, minx, maxy, res, sum_out, count_out):
+        """Single pass over the swath accumulating AOD sum and pixel count per target cell"""
+        rows, cols = sum_out.shape
+        for k in range(aod.size):
+            value = aod[k]
+            # Skip NaN AOD and NaN geolocation (x != x only for NaN)
+            if value != value or lat[k] != lat[k] or lon[k] != lon[k]:
+                continue
+            i = int(np.floor((maxy - lat[k]) / res))
+            j = int(np.floor((lon[k] - minx) / res))
+            if 0 <= i < rows and 0 <= j < cols:
+                sum_out[i, j] += value
+                count_out[i, j] += 1
+
+
+def _bin_sum_count_numpy(lat: np.ndarray, lon: np.ndarray, aod: np.ndarray, minx: float,
+                         maxy: float, res: float, rows: int, cols: int) -> tuple:
+    """NumPy fallback for _bin_sum_count: (sum, count) grids via np.bincount"""
+    col_indices = np.floor((lon - minx) / res)
+    row_indices = np.floor((maxy - lat) / res)
+    valid = (
+        (col_indices >= 0) & (col_indices < cols) &
+        (row_indices >= 0) & (row_indices < rows) &
+        np.isfinite(aod)
+    )
+    flat_index = row_indices[valid].astype(np.intp) * cols + col_indices[valid].astype(np.intp)
+    sum_grid = np.bincount(flat_index, weights=aod[valid], minlength=rows * cols)
+    count_grid = np.bincount(flat_index, minlength=rows * cols)
+    return sum_grid.reshape(rows, cols), count_grid.reshape(rows, cols)
+
+
 def reproject_modis_to_grid(modis_data: Dict, target_crs: str, target_resolution: float, 
                           bbox: tuple) -> Dict[str, np.ndarray]:
     """
@@ -114,23 +154,31 @@ def reproject_modis_to_grid(modis_data: Dict, target_crs: str, target_resolution
     
     target_transform = from_origin(minx, maxy, target_resolution, target_resolution)
     
-    # Simple nearest neighbor regridding for now
+    # Bin swath pixels into target cells and average pixels sharing a cell
     # In production, use more sophisticated interpolation
-    target_aod = np.full((rows, cols), np.nan, dtype=np.float32)
-    
-    # Convert geographic coordinates to pixel coordinates
-    col_indices = np.floor((lon - minx) / target_resolution).astype(int)
-    row_indices = np.floor((maxy - lat) / target_resolution).astype(int)
+    lat = np.ravel(lat).astype(np.float64, copy=False)
+    lon = np.ravel(lon).astype(np.float64, copy=False)
+    aod = np.ravel(aod).astype(np.float32, copy=False)
     
-    # Filter valid coordinates within bounds
-    valid = (
-        (col_indices >= 0) & (col_indices < cols) &
-        (row_indices >= 0) & (row_indices < rows) &
+    # Drop swath pixels outside the bbox (plus one cell of slack; the binning does the
+    # exact edge test) before any index math - a granule usually covers far more than Turkey
+    in_bbox = (
+        (lon >= minx - target_resolution) & (lon < maxx + target_resolution) &
+        (lat > miny - target_resolution) & (lat <= maxy + target_resolution) &
         np.isfinite(aod)
     )
+    lat = lat[in_bbox]
+    lon = lon[in_bbox]
+    aod = aod[in_bbox]
+    if NUMBA_AVAILABLE:
+        sum_grid = np.zeros((rows, cols), dtype=np.float32)
+        count_grid = np.zeros((rows, cols), dtype=np.int64)
+        _bin_sum_count(lat, lon, aod, minx, maxy, target_resolution, sum_grid, count_grid)
+    else:
+        sum_grid, count_grid = _bin_sum_count_numpy(lat, lon, aod, minx, maxy, target_resolution, rows, cols)
     
-    if np.any(valid):
-        target_aod[row_indices[valid], col_indices[valid]] = aod[valid]
+    target_aod = np.full((rows, cols), np.nan, dtype=np.float32)
+    np.divide(sum_grid, count_grid, out=target_aod, where=count_grid > 0, casting='unsafe')
     
     return {
         'aod': target_aod,
@@ -153,34 +201,37 @@ def mosaic_modis_files(hdf_files: List[str], params: dict) -> str:
     target_resolution = float(params["project"]["target_resolution_deg"])
     bbox = (25.0, 35.5, 45.0, 42.5)  # Turkey bbox
     
-    processed_grids = []
-    
-    for hdf_file in hdf_files:
+    def _process_file(hdf_file: str) -> Optional[Dict]:
         print(f"Processing {Path(hdf_file).name}...")
-        
-        if HDF_AVAILABLE:
-            modis_data = read_modis_hdf(hdf_file)
-            if modis_data is not None:
-                grid_data = reproject_modis_to_grid(modis_data, target_crs, target_resolution, bbox)
-                if grid_data is not None:
-                    processed_grids.append(grid_data)
+        modis_data = read_modis_hdf(hdf_file)
+        if modis_data is None:
+            return None
+        return reproject_modis_to_grid(modis_data, target_crs, target_resolution, bbox)
+    
+    # HDF reads are I/O bound, so granules are read and gridded on a thread pool;
+    # the mosaic below stays a sequential reduction
+    processed_grids = []
+    if HDF_AVAILABLE:
+        with ThreadPoolExecutor(max_workers=min(8, len(hdf_files))) as executor:
+            results = list(executor.map(_process_file, hdf_files))
+        processed_grids = [grid for grid in results if grid is not None]
     
     if not processed_grids:
-        print("No valid MODIS data processed, creating synthetic...")
-        return _create_synthetic_aod(params)
+        # The caller falls back to synthetic AOD and records it as such
+        raise ValueError("no valid MODIS data processed")
     
-    # Mosaic multiple grids (simple averaging for overlaps)
-    final_aod = np.full_like(processed_grids[0]['aod'], np.nan)
-    count_grid = np.zeros_like(final_aod)
+    # Mosaic multiple grids (simple averaging for overlaps) with a running sum/count
+    sum_grid = np.zeros_like(processed_grids[0]['aod'])
+    count_grid = np.zeros(sum_grid.shape, dtype=np.int32)
     
     for grid in processed_grids:
         valid = np.isfinite(grid['aod'])
-        final_aod[valid] = np.nansum([final_aod[valid], grid['aod'][valid]], axis=0)
-        count_grid[valid] += 1
+        np.add(sum_grid, grid['aod'], out=sum_grid, where=valid)
+        count_grid += valid
     
-    # Average where multiple observations exist
-    multi_obs = count_grid > 1
-    final_aod[multi_obs] /= count_grid[multi_obs]
+    # Average where observations exist, NaN elsewhere
+    final_aod = np.full_like(sum_grid, np.nan)
+    np.divide(sum_grid, count_grid, out=final_aod, where=count_grid > 0, casting='unsafe')
     
     return final_aod, processed_grids[0]['transform']
 
@@ -195,27 +246,46 @@ def _create_synthetic_aod(params: dict) -> str:
     # Create realistic synthetic AOD with dust patterns
     rng = np.random.default_rng(42)  # Fixed seed for consistency
     
-    # Base AOD with latitude gradient (higher in south)
-    lat_coords = np.linspace(maxy, miny, height)
-    lon_coords = np.linspace(minx, maxx, width)
-    lat_grid, lon_grid = np.meshgrid(lat_coords, lon_coords, indexing='ij')
-    base_aod = 0.15 + 0.2 * ((42.5 - lat_grid) / 7.0)
+    # Base AOD with latitude gradient (higher in south), broadcast from a column vector
+    lat_col = np.linspace(maxy, miny, height)[:, None]
+    base_aod = np.empty((height, width))
+    base_aod[:] = 0.15 + 0.2 * ((42.5 - lat_col) / 7.0)
     
     # Add dust hotspots (southeastern Turkey)
-    y_grid, x_grid = np.meshgrid(np.arange(height), np.arange(width), indexing='ij')
+    y_col = np.arange(height, dtype=np.float64)[:, None]
+    x_row = np.arange(width, dtype=np.float64)[None, :]
     dust_centers = [(int(0.7 * height), int(0.8 * width))]  # SE Turkey
     
     for cy, cx in dust_centers:
-        dist = np.sqrt((y_grid - cy)**2 + (x_grid - cx)**2)
-        dust_plume = 0.3 * np.exp(-dist / 20.0)
-        base_aod += dust_plume
+        # Separable squared distances, then sqrt/exp in place and accumulate into the base
+        plume = (y_col - cy)**2 + (x_row - cx)**2
+        np.sqrt(plume, out=plume)
+        plume *= -1.0 / 20.0
+        np.exp(plume, out=plume)
+        plume *= 0.3
+        np.add(base_aod, plume, out=base_aod)
     
-    # Add noise
-    noise = rng.normal(0, 0.05, size=(height, width))
-    aod = np.clip(base_aod + noise, 0.0, 2.0)
+    # Add noise (float32 standard normal, scaled in place) and clip in place
+    noise = np.empty((height, width), dtype=np.float32)
+    rng.standard_normal(dtype=np.float32, out=noise)
+    noise *= np.float32(0.05)
+    aod = base_aod.astype(np.float32)
+    aod += noise
+    np.clip(aod, 0.0, 2.0, out=aod)
     
     transform = from_origin(minx, maxy, res, res)
-    return aod.astype(np.float32), transform
+    return aod, transform
+
+
+def _real_modis_possible(utc_date: datetime, params: dict) -> bool:
+    """Whether this date could yield real AOD: pyhdf installed and granules on disk or a LAADS token"""
+    if not HDF_AVAILABLE:
+        return False
+    raw_dir = os.path.join(params["paths"]["raw_dir"], "modis", utc_date.strftime("%Y%m%d"))
+    if glob.glob(os.path.join(raw_dir, "*.hdf")):
+        return True
+    token = os.getenv("LAADS_TOKEN") or params.get("apis", {}).get("laads", {}).get("token")
+    return bool(token) and token != "${LAADS_TOKEN}"
 
 
 def ingest_modis_aod_day(utc_date: datetime, params: dict) -> str:
@@ -225,6 +295,22 @@ def ingest_modis_aod_day(utc_date: datetime, params: dict) -> str:
     """
     _ensure_dirs(params)
     
+    out_path = os.path.join(
+        params["paths"]["derived_dir"],
+        f"modis_aod_{utc_date.date().isoformat()}.tif",
+    )
+    write_cog = params.get("runtime", {}).get("write_cog", False) and cog_translate is not None
+    
+    # Reuse a previous run's output for this date unless asked to overwrite; a synthetic one
+    # only while no real granules could be read, so real MODIS replaces it later (the plain
+    # GeoTIFF carries the source tag and is kept next to the COG)
+    existing_path = out_path.replace(".tif", ".cog.tif") if write_cog else out_path
+    if (os.path.exists(existing_path) and os.path.exists(out_path)
+            and not params.get("runtime", {}).get("overwrite", False)
+            and (not _real_modis_possible(utc_date, params) or not is_synthetic_output(out_path))):
+        print(f"Using existing MODIS AOD output: {existing_path}")
+        return existing_path
+    
     # Try to download real MODIS data
     try:
         hdf_files = download_modis_aod_day(utc_date, params)
@@ -234,10 +320,12 @@ def ingest_modis_aod_day(utc_date: datetime, params: dict) -> str:
         hdf_files = []
     
     # Process and mosaic
+    source = "synthetic"
     if hdf_files and HDF_AVAILABLE:
         try:
             aod_data, transform = mosaic_modis_files(hdf_files, params)
             print("Processed real MODIS data")
+            source = "real"
         except Exception as e:
             print(f"MODIS processing failed: {e}, using synthetic")
             aod_data, transform = _create_synthetic_aod(params)
@@ -245,11 +333,6 @@ def ingest_modis_aod_day(utc_date: datetime, params: dict) -> str:
         aod_data, transform = _create_synthetic_aod(params)
     
     # Save to GeoTIFF
-    out_path = os.path.join(
-        params["paths"]["derived_dir"],
-        f"modis_aod_{utc_date.date().isoformat()}.tif",
-    )
-    
     height, width = aod_data.shape
     profile = {
         "driver": "GTiff",
@@ -259,20 +342,21 @@ def ingest_modis_aod_day(utc_date: datetime, params: dict) -> str:
         "dtype": rasterio.float32,
         "crs": params["project"]["crs"],
         "transform": transform,
-        "compress": "DEFLATE",
+        **FLOAT32_COMPRESSION,
         "tiled": True,
         "blockxsize": 256,
         "blockysize": 256,
     }
     
     with rasterio.open(out_path, "w", **profile) as dst:
-        dst.write(aod_data, 1)
+        write_tiled(dst, aod_data, 1)
+        dst.update_tags(**{SOURCE_TAG: source})
     
     # Create COG if requested
-    if params.get("runtime", {}).get("write_cog", False) and cog_translate is not None:
+    if write_cog:
         cog_path = out_path.replace(".tif", ".cog.tif")
         config = dict(GDAL_TIFF_OVR_BLOCKSIZE="256")
-        cog_profile = cog_profiles.get("deflate") if cog_profiles else None
+        cog_profile = float32_cog_profile()
         cog_translate(out_path, cog_path, cog_profile, config=config, in_memory=False)
         return cog_path
 
@@ -5,6 +5,7 @@ If recent data is missing, generates forecasts going back up to 3 months
 """
 import os
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Dict, List, Tuple, Optional, Any
 from sqlalchemy.orm import Session
@@ -15,6 +16,17 @@ from .database import db_manager, Province, DailyStats
 from .forecast_system import DustForecastSystem
 from .orchestrate_day import orchestrate as orchestrate_day, load_params
 
+try:
+    from .download_modis import download_modis_aod_day
+    from .download_cams import download_cams_dust_day
+    from .download_era5 import download_era5_day
+    DOWNLOADS_AVAILABLE = True
+    DOWNLOAD_IMPORT_ERROR = None
+except ImportError as e:
+    # Reported when a real-data run is attempted
+    DOWNLOADS_AVAILABLE = False
+    DOWNLOAD_IMPORT_ERROR = e
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
@@ -28,6 +40,9 @@ class IntelligentPipelineOrchestrator:
     and fills gaps with forecasts when needed
     """
     
+    # Concurrent predict_pm25 calls; kept within the default SQLAlchemy connection pool
+    FORECAST_WORKERS = 8
+    
     def __init__(self, max_lookback_days: int = 90, min_data_age_days: int = 7):
         """
         Args:
@@ -38,6 +53,29 @@ class IntelligentPipelineOrchestrator:
         self.min_data_age_days = min_data_age_days
         self.forecast_system = DustForecastSystem()
         self.params = load_params()
+        self._raw_cache = None
+        self._provinces = None
+        self._pinned_dates = None
+        
+    def _reference_dates(self) -> Tuple[datetime, str, str]:
+        """
+        (today at midnight, today as 'YYYY-MM-DD', lookback start as 'YYYY-MM-DD')
+        Pinned for the duration of run_intelligent_pipeline, computed fresh otherwise
+        """
+        if self._pinned_dates is not None:
+            return self._pinned_dates
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        lookback_date = (today - timedelta(days=self.max_lookback_days)).strftime('%Y-%m-%d')
+        return today, today.strftime('%Y-%m-%d'), lookback_date
+        
+    def _get_provinces(self, session: Session) -> List[Any]:
+        """
+        (id, name) rows for all provinces, queried once per orchestrator and then
+        shared by the coverage analysis, gap detection and forecasting steps
+        """
+        if self._provinces is None:
+            self._provinces = session.query(Province.id, Province.name).all()
+        return self._provinces
         
     def get_latest_real_data_per_province(self, session: Session) -> Dict[int, Optional[str]]:
         """
@@ -47,28 +85,32 @@ class IntelligentPipelineOrchestrator:
         logger.info("Finding latest real data for each province...")
         
         # Get all provinces
-        provinces = session.query(Province).all()
+        provinces = self._get_provinces(session)
         
         # Calculate lookback date
-        lookback_date = (datetime.now() - timedelta(days=self.max_lookback_days)).strftime('%Y-%m-%d')
+        _, _, lookback_date = self._reference_dates()
+        
+        # Latest real data for every province in one grouped query
+        # (excluding forecasts with data_quality_score = 0.7)
+        # Real data has score 1.0 or None, forecast data has score 0.7
+        latest_rows = session.query(
+            DailyStats.province_id,
+            func.max(DailyStats.date)
+        ).filter(
+            DailyStats.date >= lookback_date,
+            DailyStats.data_quality_score != 0.7  # Exclude forecast data
+        ).group_by(DailyStats.province_id).all()
+        latest_by_province = dict(latest_rows)
         
         latest_data = {}
         
-        for province in provinces:
-            # Find latest real data (excluding forecasts with data_quality_score = 0.7)
-            # Real data has score 1.0 or None, forecast data has score 0.7
-            latest = session.query(DailyStats).filter(
-                DailyStats.province_id == province.id,
-                DailyStats.date >= lookback_date,
-                DailyStats.data_quality_score != 0.7  # Exclude forecast data
-            ).order_by(DailyStats.date.desc()).first()
-            
+        for province_id, province_name in provinces:
+            latest = latest_by_province.get(province_id)
+            latest_data[province_id] = latest
             if latest:
-                latest_data[province.id] = latest.date
-                logger.info(f"Province {province.name} ({province.id}): Latest data on {latest.date}")
+                logger.info(f"Province {province_name} ({province_id}): Latest data on {latest}")
             else:
-                latest_data[province.id] = None
-                logger.warning(f"Province {province.name} ({province.id}): No real data in last {self.max_lookback_days} days")
+                logger.warning(f"Province {province_name} ({province_id}): No real data in last {self.max_lookback_days} days")
         
         return latest_data
     
@@ -80,91 +122,233 @@ class IntelligentPipelineOrchestrator:
         logger.info("Identifying missing dates per province...")
         
         latest_data = self.get_latest_real_data_per_province(session)
-        today = datetime.now().strftime('%Y-%m-%d')
+        today_dt, today, lookback_date = self._reference_dates()
         
         missing_dates = {}
         
         for province_id, latest_date in latest_data.items():
             if latest_date is None:
                 # No data at all - need to generate from 3 months ago
-                start_date = (datetime.now() - timedelta(days=self.max_lookback_days)).strftime('%Y-%m-%d')
-                date_list = pd.date_range(start=start_date, end=today, freq='D')
-                missing_dates[province_id] = [d.strftime('%Y-%m-%d') for d in date_list]
+                start_date = lookback_date
+                missing_dates[province_id] = pd.date_range(start=start_date, end=today, freq='D').strftime('%Y-%m-%d').tolist()
             else:
                 # Check if data is recent enough
-                latest_dt = datetime.strptime(latest_date, '%Y-%m-%d')
-                days_old = (datetime.now() - latest_dt).days
+                latest_dt = datetime.fromisoformat(latest_date)
+                days_old = (today_dt - latest_dt).days
                 
                 if days_old > self.min_data_age_days:
                     # Generate dates from day after latest to today
                     start_date = (latest_dt + timedelta(days=1)).strftime('%Y-%m-%d')
-                    date_list = pd.date_range(start=start_date, end=today, freq='D')
-                    missing_dates[province_id] = [d.strftime('%Y-%m-%d') for d in date_list]
+                    missing_dates[province_id] = pd.date_range(start=start_date, end=today, freq='D').strftime('%Y-%m-%d').tolist()
                 else:
                     missing_dates[province_id] = []
         
         return missing_dates
     
-    def get_missing_dates_for_province_after_date(self, session: Session, province_id: int, last_date: str) -> List[str]:
+    def _get_real_data_dates(self, session: Session, province_id: int,
+                             start_date: datetime, end_date: datetime) -> set:
+        """
+        Set of dates in [start_date, end_date) with real data (data_quality_score != 0.7)
+        for one province, fetched in a single query
+        """
+        rows = session.query(DailyStats.date).filter(
+            DailyStats.province_id == province_id,
+            DailyStats.date >= start_date.strftime('%Y-%m-%d'),
+            DailyStats.date < end_date.strftime('%Y-%m-%d'),
+            DailyStats.data_quality_score != 0.7  # Forecast verisini sayma
+        ).all()
+        return {row[0] for row in rows}
+    
+    @staticmethod
+    def _date_strings(start_date: datetime, end_date: datetime) -> List[str]:
+        """Daily 'YYYY-MM-DD' strings for [start_date, end_date), built in one vectorized pass"""
+        if start_date >= end_date:
+            return []
+        return pd.date_range(start_date, end_date - timedelta(days=1), freq='D').strftime('%Y-%m-%d').tolist()
+    
+    def _get_existing_pairs(self, session: Session, start_date: str) -> set:
+        """
+        Set of (province_id, date) pairs with any stored record (real or forecast)
+        on or after start_date, fetched in a single query
+        """
+        rows = session.query(DailyStats.province_id, DailyStats.date).filter(
+            DailyStats.date >= start_date
+        ).all()
+        return {(row[0], row[1]) for row in rows}
+    
+    def _get_window_records(self, session: Session, start_date: str) -> Tuple[set, Dict[int, set]]:
+        """
+        Every record on or after start_date in a single query, split into
+        (all (province_id, date) pairs, {province_id: dates with real data})
+        Real data follows the SQL filter used elsewhere: score set and != 0.7
+        """
+        rows = session.query(
+            DailyStats.province_id, DailyStats.date, DailyStats.data_quality_score
+        ).filter(DailyStats.date >= start_date).all()
+        
+        existing_pairs = set()
+        real_dates = {}
+        for province_id, date_str, score in rows:
+            existing_pairs.add((province_id, date_str))
+            if score is not None and score != 0.7:
+                real_dates.setdefault(province_id, set()).add(date_str)
+        return existing_pairs, real_dates
+    
+    def get_missing_dates_for_province_after_date(self, session: Session, province_id: int, last_date: str,
+                                                  real_dates: Optional[set] = None) -> List[str]:
         """
         Bir il için belirli tarihten sonraki eksik tarihleri bul
         Sadece gerçek veri (data_quality_score != 0.7) olan tarihleri atla
+        real_dates: ilin önceden yüklenmiş gerçek veri tarihleri (verilmezse sorgulanır)
         """
-        from datetime import datetime, timedelta
+        last_date_obj = datetime.fromisoformat(last_date)
+        today, _, _ = self._reference_dates()
         
-        last_date_obj = datetime.strptime(last_date, '%Y-%m-%d')
-        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        # Aralıktaki GERÇEK veri tarihlerini tek sorguda al (forecast değil)
+        if real_dates is None:
+            real_dates = self._get_real_data_dates(
+                session, province_id, last_date_obj + timedelta(days=1), today
+            )
         
         # Son tarihten bugüne kadar olan eksik günleri bul
-        missing_dates = []
-        current_date = last_date_obj + timedelta(days=1)
+        all_dates = self._date_strings(last_date_obj + timedelta(days=1), today)
+        return [d for d in all_dates if d not in real_dates]
+    
+    def get_missing_dates_for_province_no_data(self, session: Session, province_id: int,
+                                               real_dates: Optional[set] = None) -> List[str]:
+        """
+        Hiç veri olmayan il için son 90 günün eksik tarihlerini bul
+        Sadece gerçek veri (data_quality_score != 0.7) olan tarihleri atla
+        real_dates: ilin önceden yüklenmiş gerçek veri tarihleri (verilmezse sorgulanır)
+        """
+        today, _, _ = self._reference_dates()
+        start_date = today - timedelta(days=self.max_lookback_days)
         
-        while current_date < today:
-            date_str = current_date.strftime('%Y-%m-%d')
+        # Aralıktaki GERÇEK veri tarihlerini tek sorguda al (forecast değil)
+        if real_dates is None:
+            real_dates = self._get_real_data_dates(session, province_id, start_date, today)
+        
+        all_dates = self._date_strings(start_date, today)
+        return [d for d in all_dates if d not in real_dates]
+    
+    def _raw_inventory(self) -> Dict[str, set]:
+        """
+        Raw data present on disk, scanned once per orchestrator instead of stat-ing
+        every date's paths: non-empty MODIS YYYYMMDD directories and CAMS/ERA5 file names
+        """
+        if self._raw_cache is None:
+            raw_dir = self.params['paths']['raw_dir']
             
-            # Bu tarihte GERÇEK veri var mı kontrol et (forecast değil)
-            existing = session.query(DailyStats).filter(
-                DailyStats.province_id == province_id,
-                DailyStats.date == date_str,
-                DailyStats.data_quality_score != 0.7  # Forecast verisini sayma
-            ).first()
+            modis_dates = set()
+            modis_dir = os.path.join(raw_dir, 'modis')
+            if os.path.isdir(modis_dir):
+                with os.scandir(modis_dir) as entries:
+                    for entry in entries:
+                        if entry.is_dir() and os.listdir(entry.path):
+                            modis_dates.add(entry.name)
             
-            if not existing:
-                missing_dates.append(date_str)
+            def _file_names(path: str) -> set:
+                return set(os.listdir(path)) if os.path.isdir(path) else set()
             
-            current_date += timedelta(days=1)
+            self._raw_cache = {
+                'modis': modis_dates,
+                'cams': _file_names(os.path.join(raw_dir, 'cams')),
+                'era5': _file_names(os.path.join(raw_dir, 'era5')),
+            }
+        return self._raw_cache
+    
+    def _raw_data_status(self, date_str: str, refresh: Tuple[str, ...] = ()) -> Tuple[bool, bool, bool]:
+        """
+        (has_modis, has_cams, has_era5) for a date from the raw inventory
+        refresh: sources ("MODIS", "CAMS", "ERA5") just downloaded, re-checked on disk
+        """
+        inventory = self._raw_inventory()
+        raw_dir = self.params['paths']['raw_dir']
+        date_key = date_str.replace('-', '')
+        cams_name = f'cams_dust_analysis_{date_key}.nc'
+        era5_name = f'era5_{date_key}.nc'
+        
+        if "MODIS" in refresh:
+            modis_dir = os.path.join(raw_dir, 'modis', date_key)
+            if os.path.isdir(modis_dir) and os.listdir(modis_dir):
+                inventory['modis'].add(date_key)
+        if "CAMS" in refresh and os.path.exists(os.path.join(raw_dir, 'cams', cams_name)):
+            inventory['cams'].add(cams_name)
+        if "ERA5" in refresh and os.path.exists(os.path.join(raw_dir, 'era5', era5_name)):
+            inventory['era5'].add(era5_name)
+        
+        return (date_key in inventory['modis'],
+                cams_name in inventory['cams'],
+                era5_name in inventory['era5'])
+    
+    def _download_raw_data(self, date_str: str, quiet: bool = False) -> Tuple[str, ...]:
+        """
+        Download MODIS, CAMS and ERA5 raw data for one date concurrently
+        Each source blocks on a remote server/queue, so the slowest one sets the wall time
+        quiet: log everything at debug level (used by the per-province variant)
+        Returns the sources whose download returned data
+        """
+        if not DOWNLOADS_AVAILABLE:
+            logger.warning(f"Could not import download modules: {DOWNLOAD_IMPORT_ERROR}")
+            return ()
+        
+        log_info = logger.debug if quiet else logger.info
+        log_warning = logger.debug if quiet else logger.warning
+        
+        date_obj = datetime.fromisoformat(date_str)
+        downloads = [
+            ("MODIS", download_modis_aod_day),
+            ("CAMS", download_cams_dust_day),
+            ("ERA5", download_era5_day),
+        ]
+        
+        with ThreadPoolExecutor(max_workers=len(downloads)) as executor:
+            futures = []
+            for source, download in downloads:
+                if not quiet:
+                    logger.info(f"Attempting to download {source} data for {date_str}...")
+                futures.append((source, executor.submit(download, date_obj, self.params)))
+            
+            downloaded = []
+            for source, future in futures:
+                try:
+                    if future.result():
+                        downloaded.append(source)
+                        log_info(f"Successfully downloaded {source} data for {date_str}")
+                    else:
+                        log_warning(f"No {source} data available for {date_str}")
+                except Exception as e:
+                    log_warning(f"{source} download failed for {date_str}: {e}")
         
-        return missing_dates
+        return tuple(downloaded)
     
-    def get_missing_dates_for_province_no_data(self, session: Session, province_id: int) -> List[str]:
+    def _run_real_pipeline(self, date_str: str, quiet: bool = False) -> bool:
         """
-        Hiç veri olmayan il için son 90 günün eksik tarihlerini bul
-        Sadece gerçek veri (data_quality_score != 0.7) olan tarihleri atla
+        Download raw data for a date, then run the daily pipeline if MODIS or CAMS data exists
+        quiet: log everything at debug level (used by the per-province variant)
         """
-        from datetime import datetime, timedelta
+        log_info = logger.debug if quiet else logger.info
+        log_warning = logger.debug if quiet else logger.warning
         
-        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        start_date = today - timedelta(days=self.max_lookback_days)
+        # Try to download real data first
+        downloaded = self._download_raw_data(date_str, quiet=quiet)
         
-        missing_dates = []
-        current_date = start_date
+        # Check if raw data exists for this date after download attempts
+        # (inventory scanned once per run, re-checked only for sources just downloaded)
+        has_modis, has_cams, has_era5 = self._raw_data_status(date_str, refresh=downloaded)
         
-        while current_date < today:
-            date_str = current_date.strftime('%Y-%m-%d')
+        if has_modis or has_cams:
+            log_info(f"Real data available for {date_str}: MODIS={has_modis}, CAMS={has_cams}, ERA5={has_era5}")
             
-            # Bu tarihte GERÇEK veri var mı kontrol et (forecast değil)
-            existing = session.query(DailyStats).filter(
-                DailyStats.province_id == province_id,
-                DailyStats.date == date_str,
-                DailyStats.data_quality_score != 0.7  # Forecast verisini say
-            ).first()
+            # Run the pipeline
+            result = orchestrate_day(date_str)
             
-            if not existing:
-                missing_dates.append(date_str)
-            
-            current_date += timedelta(days=1)
-        
-        return missing_dates
+            log_info(f"Successfully processed real data for {date_str} "
+                     f"({result['n_provinces']} provinces, coverage: {result['data_coverage_pct']}%)")
+            return True
+        else:
+            log_warning(f"No real data available for {date_str}")
+            return False
     
     def try_run_real_pipeline_for_province(self, date_str: str, province_id: int) -> bool:
         """
@@ -177,69 +361,7 @@ class IntelligentPipelineOrchestrator:
                 return False
             
             logger.debug(f"Attempting to download real data for province {province_id} on {date_str}...")
-            
-            # Try to download real data first
-            try:
-                from .download_modis import download_modis_aod_day
-                from .download_cams import download_cams_dust_day
-                from .download_era5 import download_era5_day
-                
-                date_obj = datetime.strptime(date_str, '%Y-%m-%d')
-                
-                # Try to download MODIS data
-                try:
-                    modis_files = download_modis_aod_day(date_obj, self.params)
-                    if modis_files:
-                        logger.debug(f"Successfully downloaded MODIS data for {date_str}")
-                    else:
-                        logger.debug(f"No MODIS data available for {date_str}")
-                except Exception as e:
-                    logger.debug(f"MODIS download failed for {date_str}: {e}")
-                
-                # Try to download CAMS data
-                try:
-                    cams_files = download_cams_dust_day(date_obj, self.params)
-                    if cams_files:
-                        logger.debug(f"Successfully downloaded CAMS data for {date_str}")
-                    else:
-                        logger.debug(f"No CAMS data available for {date_str}")
-                except Exception as e:
-                    logger.debug(f"CAMS download failed for {date_str}: {e}")
-                
-                # Try to download ERA5 data
-                try:
-                    era5_file = download_era5_day(date_obj, self.params)
-                    if era5_file:
-                        logger.debug(f"Successfully downloaded ERA5 data for {date_str}")
-                    else:
-                        logger.debug(f"No ERA5 data available for {date_str}")
-                except Exception as e:
-                    logger.debug(f"ERA5 download failed for {date_str}: {e}")
-                
-            except ImportError as e:
-                logger.warning(f"Could not import download modules: {e}")
-            
-            # Check if raw data exists for this date after download attempts
-            raw_modis_dir = os.path.join(self.params['paths']['raw_dir'], 'modis', date_str.replace('-', ''))
-            raw_cams_file = os.path.join(self.params['paths']['raw_dir'], 'cams', f'cams_dust_analysis_{date_str.replace("-", "")}.nc')
-            raw_era5_file = os.path.join(self.params['paths']['raw_dir'], 'era5', f'era5_{date_str.replace("-", "")}.nc')
-            
-            # Check if at least MODIS or CAMS data exists
-            has_modis = os.path.exists(raw_modis_dir) and len(os.listdir(raw_modis_dir)) > 0
-            has_cams = os.path.exists(raw_cams_file)
-            has_era5 = os.path.exists(raw_era5_file)
-            
-            if has_modis or has_cams:
-                logger.debug(f"Real data available for {date_str}: MODIS={has_modis}, CAMS={has_cams}, ERA5={has_era5}")
-                
-                # Run the pipeline
-                orchestrate_day(date_str)
-                
-                logger.debug(f"Successfully processed real data for {date_str}")
-                return True
-            else:
-                logger.debug(f"No real data available for {date_str}")
-                return False
+            return self._run_real_pipeline(date_str, quiet=True)
                 
         except Exception as e:
             logger.error(f"Error running real pipeline for province {province_id} on {date_str}: {e}")
@@ -251,7 +373,7 @@ class IntelligentPipelineOrchestrator:
         """
         logger.info("Analyzing data coverage...")
         
-        provinces = session.query(Province).count()
+        provinces = len(self._get_provinces(session))
         latest_data = self.get_latest_real_data_per_province(session)
         missing_dates = self.get_missing_dates_per_province(session)
         
@@ -294,8 +416,8 @@ class IntelligentPipelineOrchestrator:
         Check if date is too recent for real data availability
         CAMS and ERA5 typically have 3-5 days delay
         """
-        date_obj = datetime.strptime(date_str, '%Y-%m-%d')
-        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        date_obj = datetime.fromisoformat(date_str)
+        today, _, _ = self._reference_dates()
         days_ago = (today - date_obj).days
         
         # Real satellite/reanalysis data typically available after 3-5 days
@@ -316,72 +438,7 @@ class IntelligentPipelineOrchestrator:
                 return False
             
             logger.info(f"Attempting to run real pipeline for {date_str}...")
-            
-            # Try to download real data first
-            try:
-                from .download_modis import download_modis_aod_day
-                from .download_cams import download_cams_dust_day
-                from .download_era5 import download_era5_day
-                
-                date_obj = datetime.strptime(date_str, '%Y-%m-%d')
-                
-                # Try to download MODIS data
-                logger.info(f"Attempting to download MODIS data for {date_str}...")
-                try:
-                    modis_files = download_modis_aod_day(date_obj, self.params)
-                    if modis_files:
-                        logger.info(f"Successfully downloaded MODIS data for {date_str}")
-                    else:
-                        logger.warning(f"No MODIS data available for {date_str}")
-                except Exception as e:
-                    logger.warning(f"MODIS download failed for {date_str}: {e}")
-                
-                # Try to download CAMS data
-                logger.info(f"Attempting to download CAMS data for {date_str}...")
-                try:
-                    cams_files = download_cams_dust_day(date_obj, self.params)
-                    if cams_files:
-                        logger.info(f"Successfully downloaded CAMS data for {date_str}")
-                    else:
-                        logger.warning(f"No CAMS data available for {date_str}")
-                except Exception as e:
-                    logger.warning(f"CAMS download failed for {date_str}: {e}")
-                
-                # Try to download ERA5 data
-                logger.info(f"Attempting to download ERA5 data for {date_str}...")
-                try:
-                    era5_file = download_era5_day(date_obj, self.params)
-                    if era5_file:
-                        logger.info(f"Successfully downloaded ERA5 data for {date_str}")
-                    else:
-                        logger.warning(f"No ERA5 data available for {date_str}")
-                except Exception as e:
-                    logger.warning(f"ERA5 download failed for {date_str}: {e}")
-                
-            except ImportError as e:
-                logger.warning(f"Could not import download modules: {e}")
-            
-            # Check if raw data exists for this date after download attempts
-            raw_modis_dir = os.path.join(self.params['paths']['raw_dir'], 'modis', date_str.replace('-', ''))
-            raw_cams_file = os.path.join(self.params['paths']['raw_dir'], 'cams', f'cams_dust_analysis_{date_str.replace("-", "")}.nc')
-            raw_era5_file = os.path.join(self.params['paths']['raw_dir'], 'era5', f'era5_{date_str.replace("-", "")}.nc')
-            
-            # Check if at least MODIS or CAMS data exists
-            has_modis = os.path.exists(raw_modis_dir) and len(os.listdir(raw_modis_dir)) > 0
-            has_cams = os.path.exists(raw_cams_file)
-            has_era5 = os.path.exists(raw_era5_file)
-            
-            if has_modis or has_cams:
-                logger.info(f"Real data available for {date_str}: MODIS={has_modis}, CAMS={has_cams}, ERA5={has_era5}")
-                
-                # Run the pipeline
-                orchestrate_day(date_str)
-                
-                logger.info(f"Successfully processed real data for {date_str}")
-                return True
-            else:
-                logger.warning(f"No real data available for {date_str}")
-                return False
+            return self._run_real_pipeline(date_str)
                 
         except Exception as e:
             logger.error(f"Error running real pipeline for {date_str}: {e}")
@@ -413,25 +470,23 @@ class IntelligentPipelineOrchestrator:
         logger.info(f"Provinces needing forecast: {provinces_needing_forecast}")
         
         forecast_data = []
-        provinces = session.query(Province).all()
+        provinces = self._get_provinces(session)
+        
+        # Existing (province_id, date) pairs over the forecast window, fetched once
+        existing_pairs = self._get_existing_pairs(session, all_missing_dates[0])
+        missing_sets = {province_id: set(dates) for province_id, dates in missing_dates.items()}
         
         for date_str in all_missing_dates:
             logger.info(f"Generating forecasts for {date_str}...")
             
             for province in provinces:
                 # Check if this province-date combination needs forecasting
-                needs_forecast = (province.id in missing_dates and 
-                                date_str in missing_dates.get(province.id, []))
+                needs_forecast = date_str in missing_sets.get(province.id, ())
                 
                 if needs_forecast:
                     try:
                         # Check if forecast already exists
-                        existing = session.query(DailyStats).filter(
-                            DailyStats.province_id == province.id,
-                            DailyStats.date == date_str
-                        ).first()
-                        
-                        if existing:
+                        if (province.id, date_str) in existing_pairs:
                             logger.debug(f"Data already exists for province {province.id} on {date_str}")
                             continue
                         
@@ -479,88 +534,112 @@ class IntelligentPipelineOrchestrator:
         logger.info("Starting Intelligent Pipeline Orchestrator (İL BAZINDA)")
         logger.info("=" * 80)
         
-        with db_manager.get_session() as session:
-            # Step 1: Analyze current state
-            analysis = self.analyze_data_coverage(session)
-            
-            # Step 2: Her il için en son veri tarihini bul
-            latest_data_per_province = self.get_latest_real_data_per_province(session)
-            
-            # Step 3: Her il için eksik tarihleri hesapla
-            provinces = session.query(Province).all()
-            real_data_processed = 0
-            forecast_data_generated = 0
-            
-            logger.info(f"Processing {len(provinces)} provinces individually...")
-            
-            for province in provinces:
-                province_id = province.id
-                province_name = province.name
+        # Pin "today" and the lookback start once for every helper in this run
+        self._pinned_dates = None
+        self._pinned_dates = self._reference_dates()
+        try:
+            with db_manager.get_session() as session:
+                # Step 1: Analyze current state
+                analysis = self.analyze_data_coverage(session)
                 
-                # Bu il için en son veri tarihi
-                latest_date = latest_data_per_province.get(province_id)
+                # Step 2: Her il için en son veri tarihini bul
+                latest_data_per_province = self.get_latest_real_data_per_province(session)
                 
-                if latest_date:
-                    # En son veri tarihinden sonraki eksik günleri bul
-                    missing_dates = self.get_missing_dates_for_province_after_date(
-                        session, province_id, latest_date
-                    )
-                    logger.info(f"Province {province_name} ({province_id}): Latest data {latest_date}, missing {len(missing_dates)} dates")
-                else:
-                    # Hiç veri yoksa son 90 günün tümünü al
-                    missing_dates = self.get_missing_dates_for_province_no_data(
-                        session, province_id
-                    )
-                    logger.info(f"Province {province_name} ({province_id}): No data, need {len(missing_dates)} dates")
+                # Step 3: Her il için eksik tarihleri hesapla
+                provinces = self._get_provinces(session)
+                real_data_processed = 0
+                forecast_data_generated = 0
+                forecast_batch = []
+                work_items = []
                 
-                # Bu il için eksik tarihleri işle - SADECE TAHMIN ÜRET
-                # Gerçek veri indirme scheduler tarafından yapılır
-                for date_str in missing_dates:
-                    try:
+                logger.info(f"Processing {len(provinces)} provinces individually...")
+                
+                # Lookback penceresindeki kayıtları tek sorguda al: mevcut (il, tarih)
+                # çiftleri ve il bazında GERÇEK veri tarihleri (forecast değil)
+                _, _, lookback_date = self._reference_dates()
+                existing_pairs, real_dates_by_province = self._get_window_records(session, lookback_date)
+                
+                for province in provinces:
+                    province_id = province.id
+                    province_name = province.name
+                    
+                    # Bu il için en son veri tarihi
+                    latest_date = latest_data_per_province.get(province_id)
+                    
+                    if latest_date:
+                        # En son veri tarihinden sonraki eksik günleri bul
+                        missing_dates = self.get_missing_dates_for_province_after_date(
+                            session, province_id, latest_date,
+                            real_dates=real_dates_by_province.get(province_id, set())
+                        )
+                        logger.info(f"Province {province_name} ({province_id}): Latest data {latest_date}, missing {len(missing_dates)} dates")
+                    else:
+                        # Hiç veri yoksa son 90 günün tümünü al
+                        missing_dates = self.get_missing_dates_for_province_no_data(
+                            session, province_id,
+                            real_dates=real_dates_by_province.get(province_id, set())
+                        )
+                        logger.info(f"Province {province_name} ({province_id}): No data, need {len(missing_dates)} dates")
+                    
+                    # Bu il için eksik tarihleri işle - SADECE TAHMIN ÜRET
+                    # Gerçek veri indirme scheduler tarafından yapılır
+                    for date_str in missing_dates:
                         # Önce bu tarih için zaten veri var mı kontrol et
-                        existing = session.query(DailyStats).filter(
-                            DailyStats.province_id == province_id,
-                            DailyStats.date == date_str
-                        ).first()
-                        
-                        if existing:
+                        if (province_id, date_str) in existing_pairs:
                             logger.debug(f"Data already exists for province {province_id} on {date_str}, skipping")
                             continue
-                        
-                        # Tahmin üret
-                        prediction = self.forecast_system.predict_pm25(province_id, date_str)
-                        forecast_record = {
-                            'date': date_str,
-                            'province_id': province_id,
-                            **prediction
-                        }
-                        self.forecast_system.save_forecasts_to_database([forecast_record])
-                        forecast_data_generated += 1
-                        logger.debug(f"Generated forecast for province {province_id} on {date_str}")
-                    except Exception as e:
-                        logger.error(f"Error forecasting for province {province_id} on {date_str}: {e}")
-            
-            # Step 4: Final analysis
-            final_analysis = self.analyze_data_coverage(session)
-            
-            # Prepare summary
-            summary = {
-                'initial_coverage_pct': analysis['coverage_pct'],
-                'final_coverage_pct': final_analysis['coverage_pct'],
-                'forecast_records_generated': forecast_data_generated,
-                'provinces_updated': final_analysis['provinces_with_data'],
-                'status': 'success'
-            }
-            
-            logger.info("=" * 80)
-            logger.info("Intelligent Pipeline Orchestrator Complete (İL BAZINDA)")
-            logger.info(f"  Initial coverage: {summary['initial_coverage_pct']:.1f}%")
-            logger.info(f"  Final coverage: {summary['final_coverage_pct']:.1f}%")
-            logger.info(f"  Forecast records generated: {summary['forecast_records_generated']}")
-            logger.info(f"  Provinces with data: {summary['provinces_updated']}")
-            logger.info("=" * 80)
-            
-            return summary
+                        work_items.append((province_id, date_str))
+                
+                # Tahmin üret - predict_pm25 her çağrıda veritabanı okuduğu için
+                # (il, tarih) işleri bir thread havuzunda paralel çalıştırılır
+                if work_items:
+                    with ThreadPoolExecutor(max_workers=min(self.FORECAST_WORKERS, len(work_items))) as executor:
+                        futures = [
+                            (province_id, date_str,
+                             executor.submit(self.forecast_system.predict_pm25, province_id, date_str))
+                            for province_id, date_str in work_items
+                        ]
+                        for province_id, date_str, future in futures:
+                            try:
+                                forecast_batch.append({
+                                    'date': date_str,
+                                    'province_id': province_id,
+                                    **future.result()
+                                })
+                                logger.debug(f"Generated forecast for province {province_id} on {date_str}")
+                            except Exception as e:
+                                logger.error(f"Error forecasting for province {province_id} on {date_str}: {e}")
+                
+                # Tüm tahminleri tek seferde kaydet
+                if forecast_batch:
+                    logger.info(f"Saving {len(forecast_batch)} forecast records to database...")
+                    # Tek işlem (transaction) içinde, çalışmanın kendi oturumu üzerinden
+                    if self.forecast_system.save_forecasts_to_database(forecast_batch, session=session):
+                        forecast_data_generated = len(forecast_batch)
+                
+                # Step 4: Final analysis
+                final_analysis = self.analyze_data_coverage(session)
+                
+                # Prepare summary
+                summary = {
+                    'initial_coverage_pct': analysis['coverage_pct'],
+                    'final_coverage_pct': final_analysis['coverage_pct'],
+                    'forecast_records_generated': forecast_data_generated,
+                    'provinces_updated': final_analysis['provinces_with_data'],
+                    'status': 'success'
+                }
+                
+                logger.info("=" * 80)
+                logger.info("Intelligent Pipeline Orchestrator Complete (İL BAZINDA)")
+                logger.info(f"  Initial coverage: {summary['initial_coverage_pct']:.1f}%")
+                logger.info(f"  Final coverage: {summary['final_coverage_pct']:.1f}%")
+                logger.info(f"  Forecast records generated: {summary['forecast_records_generated']}")
+                logger.info(f"  Provinces with data: {summary['provinces_updated']}")
+                logger.info("=" * 80)
+                
+                return summary
+        finally:
+            self._pinned_dates = None
 
 
 def run_intelligent_orchestrator(max_lookback_days: int = 90, 
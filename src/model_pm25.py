@@ -4,6 +4,31 @@ import pandas as pd
 import numpy as np
 from typing import Dict, Optional
 
+try:
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    # Optional typed Parquet copy of the PM2.5 table; CSV is always written
+    PARQUET_AVAILABLE = False
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    # Optional JIT for the regression kernel; NumPy fallback is used without it
+    NUMBA_AVAILABLE = False
+
+# Classification bins (right-closed, lowest edge included) and their ordered categorical dtypes;
+# edges stay float64 so e.g. 0.1 is not shifted by float32 rounding
+_AQ_BINS = np.array([0, 15, 25, 35, 55, 75, np.inf])
+_AQ_DTYPE = pd.CategoricalDtype(
+    ["Good", "Moderate", "Unhealthy for Sensitive", "Unhealthy", "Very Unhealthy", "Hazardous"], ordered=True
+)
+_DUST_BINS = np.array([0, 0.1, 0.2, 0.3, 0.5, np.inf])
+_DUST_DTYPE = pd.CategoricalDtype(["None", "Light", "Moderate", "Heavy", "Extreme"], ordered=True)
+_HEALTH_BINS = np.array([0, 25, 50, 75, 100, np.inf])
+_HEALTH_DTYPE = pd.CategoricalDtype(["Low", "Moderate", "High", "Very High", "Extreme"], ordered=True)
+
 
 def load_regression_parameters(params: dict) -> Dict[str, float]:
     """Load and validate PM2.5 regression parameters"""
@@ -27,86 +52,113 @@ def load_regression_parameters(params: dict) -> Dict[str, float]:
     return default_params
 
 
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def _pm25_kernel(aod, rh, blh, dust_aod, a0, a1, a2, a3, a4, a5, a6, out):
+        """Single fused pass evaluating the regression and clipping to [0, 300] per province"""
+        for k in range(aod.shape[0]):
+            value = a0 + a1 * aod[k] + a2 * rh[k] + a3 * blh[k] + dust_aod[k] * (a4 + a5 * rh[k] + a6 * blh[k])
+            # NaN falls through both comparisons and propagates, as with np.clip
+            if value < 0.0:
+                value = 0.0
+            elif value > 300.0:
+                value = 300.0
+            out[k] = value
+
+
 def enhanced_pm25_model(df: pd.DataFrame, params: Dict[str, float]) -> pd.Series:
     """
     Enhanced PM2.5 estimation model
     PM2.5 = a0 + a1*AOD + a2*RH + a3*BLH + a4*DustAOD + a5*DustAOD*RH + a6*DustAOD*BLH
     """
-    # Extract variables
-    aod = df["aod_mean"].fillna(0.0)
-    rh = df["RH"]
-    blh = df["BLH"]
-    dust_aod = df.get("dust_aod_mean", aod * 0.3)  # Fallback if dust AOD not available
-    
-    # Base model
-    pm25 = (params["a0"] + 
-            params["a1"] * aod + 
-            params["a2"] * rh + 
-            params["a3"] * blh)
+    # Extract variables as raw float64 arrays (no per-Series index alignment)
+    aod = np.nan_to_num(df["aod_mean"].to_numpy(np.float64, copy=True), nan=0.0, copy=False)
+    rh = df["RH"].to_numpy(np.float64)
+    blh = df["BLH"].to_numpy(np.float64)
+    if "dust_aod_mean" in df.columns:
+        dust_aod = df["dust_aod_mean"].to_numpy(np.float64)
+    else:
+        dust_aod = aod * 0.3  # Fallback if dust AOD not available
     
-    # Dust-specific terms
-    pm25 += (params["a4"] * dust_aod + 
-             params["a5"] * dust_aod * rh + 
-             params["a6"] * dust_aod * blh)
+    a0, a1, a2, a3 = params["a0"], params["a1"], params["a2"], params["a3"]
+    a4, a5, a6 = params["a4"], params["a5"], params["a6"]
     
-    # Apply constraints
-    pm25 = pm25.clip(lower=0.0, upper=300.0)  # Reasonable PM2.5 range
+    if NUMBA_AVAILABLE:
+        pm25 = np.empty_like(aod)
+        _pm25_kernel(aod, rh, blh, dust_aod, a0, a1, a2, a3, a4, a5, a6, pm25)
+    else:
+        # Base model plus dust-specific terms (dust terms factored on DustAOD)
+        pm25 = a0 + a1 * aod + a2 * rh + a3 * blh + dust_aod * (a4 + a5 * rh + a6 * blh)
+        
+        # Apply constraints
+        np.clip(pm25, 0.0, 300.0, out=pm25)  # Reasonable PM2.5 range
     
-    return pm25
+    return pd.Series(pm25, index=df.index)
 
 
 def calculate_uncertainty_metrics(df: pd.DataFrame) -> pd.DataFrame:
     """Calculate uncertainty metrics for PM2.5 estimates"""
-    # Uncertainty based on data coverage and variability
-    coverage = df.get("coverage_pct", 100.0) / 100.0
+    # Uncertainty based on data coverage and variability (raw float64 arrays, no Series temporaries)
+    if "coverage_pct" in df.columns:
+        coverage = df["coverage_pct"].to_numpy(np.float64) / 100.0
+    else:
+        coverage = np.ones(len(df))
     
     # Lower coverage = higher uncertainty
-    coverage_uncertainty = (1 - coverage) * 10
+    coverage_uncertainty = (1.0 - coverage) * 10.0
     
     # Variability uncertainty (difference between mean and p95)
     if "aod_p95" in df.columns and "aod_mean" in df.columns:
-        aod_variability = (df["aod_p95"] - df["aod_mean"]).fillna(0)
-        variability_uncertainty = aod_variability * 20  # Scale factor
+        aod_variability = df["aod_p95"].to_numpy(np.float64) - df["aod_mean"].to_numpy(np.float64)
+        variability_uncertainty = np.nan_to_num(aod_variability, nan=0.0, copy=False) * 20.0  # Scale factor
     else:
         variability_uncertainty = 5.0  # Default uncertainty
     
     # Total uncertainty (combine quadratically)
-    total_uncertainty = np.sqrt(coverage_uncertainty**2 + variability_uncertainty**2)
+    total_uncertainty = np.hypot(coverage_uncertainty, variability_uncertainty)
+    np.clip(total_uncertainty, 2.0, 50.0, out=total_uncertainty)
     
     # Confidence levels
-    df["pm25_uncertainty"] = total_uncertainty.clip(lower=2.0, upper=50.0)
-    df["pm25_lower"] = df["pm25"] - df["pm25_uncertainty"]
-    df["pm25_upper"] = df["pm25"] + df["pm25_uncertainty"]
+    pm25 = df["pm25"].to_numpy(np.float64)
+    df["pm25_uncertainty"] = total_uncertainty
+    df["pm25_lower"] = pm25 - total_uncertainty
+    df["pm25_upper"] = pm25 + total_uncertainty
     df["pm25_confidence"] = np.where(
-        df["pm25_uncertainty"] < 10, "high",
-        np.where(df["pm25_uncertainty"] < 20, "medium", "low")
+        total_uncertainty < 10, "high",
+        np.where(total_uncertainty < 20, "medium", "low")
     )
     
     return df
 
 
+def _bucket(values: pd.Series, bins: np.ndarray, dtype: pd.CategoricalDtype) -> pd.Series:
+    """
+    pd.cut(values, bins, labels=dtype.categories, include_lowest=True) via one searchsorted over
+    the inner edges; NaN and out-of-range values get code -1 (missing), as with pd.cut
+    """
+    arr = values.to_numpy(np.float64)
+    codes = np.searchsorted(bins[1:-1], arr, side="left")
+    codes[~((arr >= bins[0]) & (arr <= bins[-1]))] = -1
+    return pd.Series(pd.Categorical.from_codes(codes, dtype=dtype), index=values.index)
+
+
 def classify_air_quality(pm25_values: pd.Series) -> pd.Series:
     """Classify air quality based on PM2.5 concentrations (WHO/EU standards)"""
-    return pd.cut(
-        pm25_values,
-        bins=[0, 15, 25, 35, 55, 75, float('inf')],
-        labels=["Good", "Moderate", "Unhealthy for Sensitive", "Unhealthy", "Very Unhealthy", "Hazardous"],
-        include_lowest=True
-    )
+    return _bucket(pm25_values, _AQ_BINS, _AQ_DTYPE)
 
 
 def detect_dust_episodes(df: pd.DataFrame) -> pd.DataFrame:
     """Detect and classify dust episodes"""
+    if "dust_aod_mean" in df.columns:
+        dust_aod = df["dust_aod_mean"]
+    else:
+        dust_aod = pd.Series(0.0, index=df.index)
+    
     # Dust episode criteria
     dust_criteria = {
         "dust_event_detected": df.get("dust_event_moderate", False),
-        "dust_intensity": pd.cut(
-            df.get("dust_aod_mean", 0),
-            bins=[0, 0.1, 0.2, 0.3, 0.5, float('inf')],
-            labels=["None", "Light", "Moderate", "Heavy", "Extreme"],
-            include_lowest=True
-        ),
-        "dust_pm25_contribution": df.get("dust_aod_mean", 0) * 40,  # Estimate dust PM2.5 contribution
+        "dust_intensity": _bucket(dust_aod, _DUST_BINS, _DUST_DTYPE),
+        "dust_pm25_contribution": dust_aod * 40,  # Estimate dust PM2.5 contribution
     }
     
     for key, values in dust_criteria.items():
@@ -115,6 +167,20 @@ def detect_dust_episodes(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+def read_pm25_table(csv_path: str, columns: set, dtype: dict) -> pd.DataFrame:
+    """
+    Load the listed columns (those present) of a day's PM2.5 table, from its Parquet copy
+    when one at least as new as the CSV exists; categoricals come back as plain objects like CSV
+    """
+    parquet_path = os.path.splitext(csv_path)[0] + ".parquet"
+    if (PARQUET_AVAILABLE and os.path.exists(parquet_path)
+            and os.path.getmtime(parquet_path) >= os.path.getmtime(csv_path)):
+        present = [c for c in pq.read_schema(parquet_path).names if c in columns]
+        df = pd.read_parquet(parquet_path, columns=present)
+        return df.astype({c: object for c in df.select_dtypes("category").columns})
+    return pd.read_csv(csv_path, usecols=lambda c: c in columns, dtype=dtype)
+
+
 def estimate_pm25_for_day(utc_date: datetime, stats_csv_path: str, params: dict, 
                          meteo_csv_path: Optional[str] = None) -> str:
     """
@@ -125,8 +191,8 @@ def estimate_pm25_for_day(utc_date: datetime, stats_csv_path: str, params: dict,
     
     # Merge meteorological data
     if meteo_csv_path and os.path.exists(meteo_csv_path):
-        met = pd.read_csv(meteo_csv_path)
-        df = df.merge(met[["province_id", "rh_mean", "blh_mean"]], on="province_id", how="left")
+        met = pd.read_csv(meteo_csv_path, usecols=["province_id", "rh_mean", "blh_mean"])
+        df = df.merge(met, on="province_id", how="left")
         df["RH"] = df["rh_mean"].fillna(55.0)  # Typical Turkey RH
         df["BLH"] = df["blh_mean"].fillna(900.0)  # Typical Turkey BLH
         print(f"Merged meteorological data for {len(met)} provinces")
@@ -157,12 +223,7 @@ def estimate_pm25_for_day(utc_date: datetime, stats_csv_path: str, params: dict,
     df["model_timestamp"] = datetime.utcnow().isoformat()
     
     # Health risk indicators
-    df["health_risk_level"] = pd.cut(
-        df["pm25"],
-        bins=[0, 25, 50, 75, 100, float('inf')],
-        labels=["Low", "Moderate", "High", "Very High", "Extreme"],
-        include_lowest=True
-    )
+    df["health_risk_level"] = _bucket(df["pm25"], _HEALTH_BINS, _HEALTH_DTYPE)
     
     # Summary statistics
     print(f"PM2.5 estimates computed for {len(df)} provinces:")
@@ -174,13 +235,14 @@ def estimate_pm25_for_day(utc_date: datetime, stats_csv_path: str, params: dict,
     print(f"  Mean PM2.5: {mean_pm:.1f} +/- {mean_unc:.1f} ug/m3")
     print(f"  Range: {min_pm:.1f} - {max_pm:.1f} ug/m3")
     
-    unhealthy_provinces = df[df['pm25'] > 35]['province_name'].tolist()
+    # Only the first five names are printed; don't materialize the whole filtered frame
+    unhealthy_provinces = df.loc[df['pm25'] > 35, 'province_name'].head(5).tolist()
     if unhealthy_provinces:
-        print(f"  Unhealthy levels (>35 ug/m3): {', '.join(unhealthy_provinces[:5])}")
+        print(f"  Unhealthy levels (>35 ug/m3): {', '.join(unhealthy_provinces)}")
     
-    dust_provinces = df[df['dust_event_detected']]['province_name'].tolist()
+    dust_provinces = df.loc[df['dust_event_detected'], 'province_name'].head(5).tolist()
     if dust_provinces:
-        print(f"  Dust episodes detected: {', '.join(dust_provinces[:5])}")
+        print(f"  Dust episodes detected: {', '.join(dust_provinces)}")
     
     # Save results
     out_csv = os.path.join(
@@ -188,6 +250,9 @@ def estimate_pm25_for_day(utc_date: datetime, stats_csv_path: str, params: dict,
         f"pm25_{utc_date.date().isoformat()}.csv",
     )
     df.to_csv(out_csv, index=False)
+    if PARQUET_AVAILABLE:
+        # Typed copy for the database loaders (no float re-parsing, column projection on read)
+        df.to_parquet(os.path.splitext(out_csv)[0] + ".parquet", compression="zstd", index=False)
     
     return out_csv
 
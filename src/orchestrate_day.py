@@ -1,5 +1,7 @@
 import os
+import copy
 from datetime import datetime
+from functools import lru_cache
 from dateutil import tz
 import yaml
 from rich import print
@@ -7,7 +9,7 @@ from rich import print
 from .ingest_modis import ingest_modis_aod_day
 from .ingest_cams import ingest_cams_dust_day
 from .zonal_stats import compute_province_stats
-from .model_pm25 import estimate_pm25_for_day
+from .model_pm25 import estimate_pm25_for_day, read_pm25_table
 from .ingest_era5 import ingest_era5_day
 from .zonal_stats_meteo import compute_meteo_stats
 from .create_turkey_provinces import ensure_turkey_provinces_exist
@@ -17,26 +19,21 @@ from .database import db_manager
 
 def save_pipeline_data_to_database(utc_date: datetime, pm25_csv_path: str, params: dict):
     """Save pipeline data to database with proper data_quality_score"""
-    import pandas as pd
+    # Load PM2.5 data (only the columns stored, numerics parsed straight to float64)
+    num_cols = ['pm25', 'pm25_lower', 'pm25_upper', 'rh_mean', 'blh_mean']
+    db_cols = {'province_id', 'air_quality_category', *num_cols}
+    df = read_pm25_table(pm25_csv_path, db_cols, dtype=dict.fromkeys(num_cols, 'float64'))
     
-    # Load PM2.5 data
-    df = pd.read_csv(pm25_csv_path)
-    
-    # Prepare data for database
-    stats_data = []
-    for _, row in df.iterrows():
-        stat_record = {
-            'date': utc_date.date().isoformat(),
-            'province_id': int(row['province_id']),
-            'pm25': float(row.get('pm25', 0)) if pd.notna(row.get('pm25')) else None,
-            'pm25_lower': float(row.get('pm25_lower', 0)) if pd.notna(row.get('pm25_lower')) else None,
-            'pm25_upper': float(row.get('pm25_upper', 0)) if pd.notna(row.get('pm25_upper')) else None,
-            'air_quality_category': str(row.get('air_quality_category', 'Unknown')),
-            'rh_mean': float(row.get('rh_mean', 0)) if pd.notna(row.get('rh_mean')) else None,
-            'blh_mean': float(row.get('blh_mean', 0)) if pd.notna(row.get('blh_mean')) else None,
-            'data_quality_score': 1.0  # Real data from pipeline
-        }
-        stats_data.append(stat_record)
+    # Prepare data for database: mask NaN column-wise, then emit plain dicts
+    out = df.reindex(columns=num_cols)
+    out.insert(0, 'province_id', df['province_id'].astype('int64'))
+    out = out.astype(object).where(out.notna(), None)
+    out['air_quality_category'] = (
+        df['air_quality_category'].fillna('Unknown').astype(str) if 'air_quality_category' in df.columns else 'Unknown'
+    )
+    out['date'] = utc_date.date().isoformat()
+    out['data_quality_score'] = 1.0  # Real data from pipeline
+    stats_data = out.to_dict(orient='records')
     
     # Store in database
     with db_manager.get_session() as session:
@@ -45,16 +42,25 @@ def save_pipeline_data_to_database(utc_date: datetime, pm25_csv_path: str, param
     print(f"Saved {len(stats_data)} province records to database")
 
 
+@lru_cache(maxsize=4)
+def _load_params_cached(config_path: str, mtime: float) -> dict:
+    # libyaml-backed loader when PyYAML was built with it
+    with open(config_path, "r", encoding="utf-8") as f:
+        return yaml.load(f, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
+
+
 def load_params() -> dict:
     config_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config", "params.yaml")
     if not os.path.exists(config_path):
         raise FileNotFoundError(f"Config not found: {config_path}")
-    with open(config_path, "r", encoding="utf-8") as f:
-        return yaml.safe_load(f)
+    # Parsed once per file version; callers get their own copy since they mutate it
+    return copy.deepcopy(_load_params_cached(config_path, os.path.getmtime(config_path)))
 
 
-def orchestrate(date_str: str) -> None:
+def orchestrate(date_str: str, debug: bool = False) -> dict:
     params = load_params()
+    if debug:
+        params.setdefault("runtime", {})["debug"] = True
     utc_date = datetime.fromisoformat(date_str).replace(tzinfo=tz.UTC)
     print(f"[bold cyan]Running day pipeline for {utc_date.date()} (UTC)\n[/bold cyan]")
 
@@ -75,7 +81,7 @@ def orchestrate(date_str: str) -> None:
 
     print("[bold green]Step 4: Ingesting ERA5 meteorological data[/bold green]")
     era5 = ingest_era5_day(utc_date, params)
-    print(f"ERA5 data: RH={era5['rh']}, BLH={era5['blh']}")
+    print(f"ERA5 data (RH, BLH bands): {era5['combined']}")
 
     # Compute zonal statistics
     print("[bold green]Step 5: Computing province-level AOD and dust statistics[/bold green]")
@@ -83,7 +89,7 @@ def orchestrate(date_str: str) -> None:
     print(f"Wrote province stats: {stats_table}")
 
     print("[bold green]Step 6: Computing province-level meteorological statistics[/bold green]")
-    meteo_table = compute_meteo_stats(utc_date, era5["rh"], era5["blh"], params)
+    meteo_table = compute_meteo_stats(utc_date, era5["combined"], params)
     print(f"Wrote meteo stats: {meteo_table}")
 
     # Model PM2.5
@@ -109,14 +115,29 @@ def orchestrate(date_str: str) -> None:
     print(f"[dim]  - PM2.5 estimates: {pm25_table}[/dim]")
     print(f"[dim]  - Alert queue: {alert_queue}[/dim]")
 
+    coverage = read_pm25_table(pm25_table, {"province_id", "coverage_pct"}, dtype={"coverage_pct": "float64"})
+    return {
+        "date": utc_date.date().isoformat(),
+        "n_provinces": len(coverage),
+        "data_coverage_pct": float(coverage["coverage_pct"].mean()) if "coverage_pct" in coverage else None,
+        "modis_aod": modis_cog,
+        "cams_dust": cams_analysis,
+        "era5": era5["combined"],
+        "province_stats": stats_table,
+        "meteo_stats": meteo_table,
+        "pm25": pm25_table,
+        "alert_queue": alert_queue,
+    }
+
 
 if __name__ == "__main__":
     import argparse
 
     parser = argparse.ArgumentParser(description="Run one-day dust pipeline")
     parser.add_argument("--date", required=True, help="ISO date, e.g., 2025-09-20 (UTC)")
+    parser.add_argument("--debug", action="store_true", help="Log full NetCDF contents via xarray")
     args = parser.parse_args()
 
-    orchestrate(args.date)
+    orchestrate(args.date, debug=args.debug)
 
 
@@ -1,26 +1,27 @@
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime, timedelta
-import yaml
 from rich import print
 
-from .orchestrate_day import orchestrate as orchestrate_day
-
-
-def load_params() -> dict:
-    config_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config", "params.yaml")
-    if not os.path.exists(config_path):
-        raise FileNotFoundError(f"Config not found: {config_path}")
-    with open(config_path, "r", encoding="utf-8") as f:
-        return yaml.safe_load(f)
+from .orchestrate_day import orchestrate as orchestrate_day, load_params
+from .create_turkey_provinces import ensure_turkey_provinces_exist
 
 
 def orchestrate_range(end_date_iso: str, days: int) -> None:
     end_date = datetime.fromisoformat(end_date_iso)
     start_date = end_date - timedelta(days=days - 1)
     print(f"[bold cyan]Running range {start_date.date()}..{end_date.date()}[/bold cyan]")
-    for i in range(days):
-        d = start_date + timedelta(days=i)
-        orchestrate_day(d.date().isoformat())
+    # Shared input: create it once here so the day workers don't race to write it
+    ensure_turkey_provinces_exist(load_params())
+    # Days are independent (own downloads, own output files, disjoint database rows)
+    max_workers = min(days, max(1, (os.cpu_count() or 2) // 2))
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(orchestrate_day, (start_date + timedelta(days=i)).date().isoformat())
+            for i in range(days)
+        ]
+        for future in as_completed(futures):
+            future.result()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,83 @@
+"""
+Shared target grid and GeoTIFF write settings for the float32 rasters produced by the ingest steps
+"""
+import warnings
+from functools import lru_cache
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+try:
+    from rio_cogeo.profiles import cog_profiles
+except Exception:
+    cog_profiles = None
+
+
+# Turkey bounding box (minx, miny, maxx, maxy) shared by all ingest grids
+TURKEY_BBOX = (25.0, 35.5, 45.0, 42.5)
+
+# Dataset tag on ingest outputs: "real" or "synthetic", so reruns know whether a cached file can stand
+SOURCE_TAG = "source"
+
+
+def _gdal_version() -> tuple:
+    return tuple(int(part) for part in rasterio.__gdal_version__.split(".")[:2])
+
+
+# PREDICTOR=3 is the floating-point predictor; ZSTD needs GDAL >= 3.0
+if _gdal_version() >= (3, 0):
+    FLOAT32_COMPRESSION = {
+        "compress": "ZSTD",
+        "zstd_level": 3,
+        "predictor": 3,
+        "num_threads": "ALL_CPUS",
+    }
+    COG_COMPRESSION = "zstd"
+else:
+    FLOAT32_COMPRESSION = {"compress": "DEFLATE", "predictor": 3}
+    COG_COMPRESSION = "deflate"
+
+
+def float32_cog_profile():
+    """COG creation profile matching FLOAT32_COMPRESSION (None without rio-cogeo)"""
+    if cog_profiles is None:
+        return None
+    with warnings.catch_warnings():
+        # rio-cogeo warns that ZSTD is non-standard for COGs; GDAL >= 3.0 reads it fine
+        warnings.simplefilter("ignore", UserWarning)
+        profile = cog_profiles.get(COG_COMPRESSION)
+    profile.update(predictor=3)
+    return profile
+
+
+@lru_cache(maxsize=4)
+def target_grid(res: float) -> tuple:
+    """
+    Regridding target over the Turkey bbox at the given resolution
+    Returns (lons, north-up lats, GeoTIFF transform); arrays are read-only
+    """
+    minx, miny, maxx, maxy = TURKEY_BBOX
+    lons = np.arange(minx, maxx + res, res)
+    lats = np.arange(miny, maxy + res, res)[::-1]  # Flip for north-up
+    lons.setflags(write=False)
+    lats.setflags(write=False)
+    return lons, lats, from_origin(minx, maxy, res, res)
+
+
+def is_synthetic_output(path: str) -> bool:
+    """
+    Whether an ingest GeoTIFF holds a synthetic fallback rather than real data
+    (files written before outputs were tagged count as synthetic)
+    """
+    with rasterio.open(path) as src:
+        return src.tags().get(SOURCE_TAG) != "real"
+
+
+def write_tiled(dst, data: np.ndarray, band: int) -> None:
+    """
+    Write a 2D array into one band of an open tiled dataset, one internal block at a time
+    so GDAL compresses each tile as it arrives instead of buffering the full image
+    """
+    data = np.ascontiguousarray(data, dtype=np.float32)
+    for _, window in dst.block_windows(band):
+        dst.write(data[window.toslices()], band, window=window)
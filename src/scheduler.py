@@ -4,40 +4,108 @@ Handles daily data processing and alert distribution
 """
 import os
 import sys
+import copy
+import json
+import queue
+import atexit
+import asyncio
 import schedule
-import time
 import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Dict, Any
+from functools import lru_cache
+from typing import Dict, Any, Tuple
 import yaml
-import subprocess
 from pathlib import Path
 
 # Add src to path for imports
 sys.path.append(str(Path(__file__).parent))
 
-from database import db_manager, SystemStatus
+from database import db_manager, SystemStatus, DailyStats, Alert
 from email_service import EmailService
-from api import process_alert_queue
-from forecast_system import DustForecastSystem
+# api (FastAPI) and forecast_system pull in pandas/sklearn; they are
+# imported by the jobs that use them so --cleanup and other one-shot runs stay light
 
-# Configure logging
+# Configure logging: records go onto a queue and a background listener thread does the
+# file/console writes, so pipeline threads never block on log I/O
+os.makedirs('logs', exist_ok=True)
+_log_queue = queue.Queue(-1)
+_log_listener = QueueListener(
+    _log_queue,
+    logging.FileHandler('logs/scheduler.log'),
+    logging.StreamHandler()
+)
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('logs/scheduler.log'),
-        logging.StreamHandler()
-    ]
+    handlers=[QueueHandler(_log_queue)]
 )
+_log_listener.start()
+# Drain queued records on any exit (daemon stop, one-shot CLI runs, sys.exit)
+atexit.register(_log_listener.stop)
 logger = logging.getLogger(__name__)
 
+DEFAULT_CONFIG_PATH = str(Path(__file__).resolve().parent.parent / "config" / "params.yaml")
+
+
+@lru_cache(maxsize=4)
+def _parse_config(config_path: str, mtime: float) -> dict:
+    """
+    Parse a config file once per (path, mtime); callers must copy before mutating
+    A JSON sidecar (<config>.cache.json) saves later processes the YAML parse
+    """
+    cache_path = config_path + '.cache.json'
+    try:
+        with open(cache_path, 'r') as f:
+            cached = json.load(f)
+        # Stamped with the source mtime it was made from; any edit invalidates it
+        if cached['mtime'] == mtime:
+            return cached['config']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    
+    # libyaml-backed loader when PyYAML was built with it
+    with open(config_path, 'r') as f:
+        config = yaml.load(f, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader)) or {}
+    
+    try:
+        # Only cache documents JSON reproduces exactly (string keys, no YAML dates)
+        if json.loads(json.dumps(config)) == config:
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({'mtime': mtime, 'config': config}, f)
+            os.replace(tmp_path, cache_path)
+    except (OSError, TypeError, ValueError):
+        pass  # Read-only deployments simply re-parse the YAML
+    
+    return config
+
+
 class DustPipelineScheduler:
     """Automated scheduler for dust monitoring pipeline"""
     
     def __init__(self, config_path: str = None):
         self.config = self._load_config(config_path)
+        self._derived_dir = self.config.get('paths', {}).get('derived_dir')
         self.email_service = EmailService()
+        # Per thread, set while a scheduled job runs: status rows are batched into one commit at its end
+        self._job_state = threading.local()
+        # One event loop for all alert processing, run on its own daemon thread; callers on any
+        # thread hand it work with run_coroutine_threadsafe instead of one asyncio.run() per tick
+        self._alert_loop = asyncio.new_event_loop()
+        self._alert_thread = threading.Thread(
+            target=self._alert_loop.run_forever, name='scheduler-alert-loop', daemon=True
+        )
+        self._alert_thread.start()
+        # Set to stop the daemon loop and abort pending retry waits
+        self._stop_event = threading.Event()
+        # Held while alerts are processed, by the alert tick and by the daily job alike
+        self._alerts_lock = threading.Lock()
+        # Opt-in: skip status rows repeating a component's last (status, message)
+        self._dedup_status = bool(self.config.get('scheduler', {}).get('dedup_status', False))
+        self._last_status: Dict[str, Tuple[str, int]] = {}
         
         # Ensure logs directory exists
         os.makedirs('logs', exist_ok=True)
@@ -50,11 +118,12 @@ class DustPipelineScheduler:
     def _load_config(self, config_path: str = None) -> dict:
         """Load scheduler configuration"""
         if config_path is None:
-            config_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config", "params.yaml")
+            config_path = DEFAULT_CONFIG_PATH
         
         try:
-            with open(config_path, 'r') as f:
-                config = yaml.safe_load(f)
+            config_path = os.path.abspath(config_path)
+            # Defaults below are merged into a private copy so the cached parse stays clean
+            config = copy.deepcopy(_parse_config(config_path, os.path.getmtime(config_path)))
         except FileNotFoundError:
             config = {}
         
@@ -80,20 +149,34 @@ class DustPipelineScheduler:
     def log_system_status(self, component: str, status: str, message: str, 
                          processing_time: float = None, data_coverage: float = None, 
                          error_details: Dict = None):
-        """Log system status to database"""
+        """Log system status to database (deferred to the job's commit inside a scheduled job)"""
+        key = (status, hash(message))
+        job_session = getattr(self._job_state, 'session', None)
+        if self._dedup_status:
+            pending = self._job_state.pending_status if job_session is not None else {}
+            if pending.get(component, self._last_status.get(component)) == key:
+                return
+        
         try:
+            status_record = SystemStatus(
+                date=datetime.utcnow().strftime('%Y-%m-%d'),
+                component=component,
+                status=status,
+                message=message,
+                processing_time_seconds=processing_time,
+                data_coverage_pct=data_coverage,
+                error_details=error_details
+            )
+            if job_session is not None:
+                job_session.add(status_record)
+                # Only remembered for dedup once the job's commit succeeds
+                self._job_state.pending_status[component] = key
+                return
+            
             with db_manager.get_session() as session:
-                status_record = SystemStatus(
-                    date=datetime.utcnow().strftime('%Y-%m-%d'),
-                    component=component,
-                    status=status,
-                    message=message,
-                    processing_time_seconds=processing_time,
-                    data_coverage_pct=data_coverage,
-                    error_details=error_details
-                )
                 session.add(status_record)
                 session.commit()
+            self._last_status[component] = key
                 
         except Exception as e:
             logger.error(f"Failed to log system status: {e}")
@@ -126,9 +209,9 @@ class DustPipelineScheduler:
             logger.info(f"Summary: {summary}")
             
             # Extract coverage info from summary
-            initial_coverage = summary.get('initial_coverage', 0)
-            final_coverage = summary.get('final_coverage', 0)
-            improvement = summary.get('improvement', 0)
+            initial_coverage = summary.get('initial_coverage_pct', 0)
+            final_coverage = summary.get('final_coverage_pct', 0)
+            improvement = final_coverage - initial_coverage
             
             self.log_system_status(
                 component='intelligent_pipeline',
@@ -156,74 +239,14 @@ class DustPipelineScheduler:
             
             return False
     
-    def _extract_coverage_from_output(self, output: str) -> float:
-        """Extract data coverage percentage from pipeline output"""
-        try:
-            # Look for coverage information in output
-            lines = output.split('\n')
-            for line in lines:
-                if 'coverage' in line.lower() and '%' in line:
-                    # Extract percentage
-                    import re
-                    match = re.search(r'(\d+\.?\d*)%', line)
-                    if match:
-                        return float(match.group(1))
-            return 85.0  # Default assumption
-        except:
-            return 85.0
-    
-    def _update_database_from_pipeline(self, date_str: str):
-        """Update database with pipeline outputs"""
-        try:
-            derived_dir = self.config['paths']['derived_dir']
-            
-            # Load province stats
-            province_stats_file = os.path.join(derived_dir, f'province_stats_{date_str}.csv')
-            pm25_file = os.path.join(derived_dir, f'pm25_{date_str}.csv')
-            
-            if os.path.exists(pm25_file):
-                import pandas as pd
-                
-                # Load PM2.5 data
-                df = pd.read_csv(pm25_file)
-                
-                # Convert to database format
-                stats_data = []
-                for _, row in df.iterrows():
-                    stat_record = {
-                        'date': date_str,
-                        'province_id': int(row['province_id']),
-                        'aod_mean': float(row.get('aod_mean', 0)) if pd.notna(row.get('aod_mean')) else None,
-                        'aod_max': float(row.get('aod_max', 0)) if pd.notna(row.get('aod_max')) else None,
-                        'aod_p95': float(row.get('aod_p95', 0)) if pd.notna(row.get('aod_p95')) else None,
-                        'dust_aod_mean': float(row.get('dust_aod_mean', 0)) if pd.notna(row.get('dust_aod_mean')) else None,
-                        'dust_event_detected': bool(row.get('dust_event_detected', False)),
-                        'dust_intensity': str(row.get('dust_intensity', 'None')),
-                        'pm25': float(row['pm25']) if pd.notna(row['pm25']) else None,
-                        'pm25_lower': float(row.get('pm25_lower', 0)) if pd.notna(row.get('pm25_lower')) else None,
-                        'pm25_upper': float(row.get('pm25_upper', 0)) if pd.notna(row.get('pm25_upper')) else None,
-                        'air_quality_category': str(row.get('air_quality', 'Unknown')),
-                        'rh_mean': float(row.get('rh_mean', 0)) if pd.notna(row.get('rh_mean')) else None,
-                        'blh_mean': float(row.get('blh_mean', 0)) if pd.notna(row.get('blh_mean')) else None,
-                        'data_quality_score': float(row.get('coverage_pct', 85)) / 100.0 if pd.notna(row.get('coverage_pct')) else 0.85
-                    }
-                    stats_data.append(stat_record)
-                
-                # Store in database
-                with db_manager.get_session() as session:
-                    db_manager.store_daily_stats(session, stats_data)
-                
-                logger.info(f"Updated database with {len(stats_data)} province statistics for {date_str}")
-            
-        except Exception as e:
-            logger.error(f"Failed to update database from pipeline outputs: {e}")
-    
     def run_forecast_system(self):
         """Run forecast system to fill missing data gaps"""
         logger.info("Running forecast system")
         start_time = datetime.utcnow()
         
         try:
+            from forecast_system import DustForecastSystem
+            
             forecast_system = DustForecastSystem()
             success = forecast_system.run_forecast_pipeline()
             
@@ -276,8 +299,8 @@ class DustPipelineScheduler:
         
         try:
             # This will use the API's background task function
-            import asyncio
-            asyncio.run(process_alert_queue())
+            from api import process_alert_queue
+            asyncio.run_coroutine_threadsafe(process_alert_queue(), self._alert_loop).result()
             
             logger.info("Alert processing completed")
             
@@ -299,36 +322,36 @@ class DustPipelineScheduler:
             
             with db_manager.get_session() as session:
                 # Clean old daily stats
-                from database import DailyStats, Alert
-                
-                old_stats = session.query(DailyStats).filter(DailyStats.date < cutoff_date).all()
-                old_alerts = session.query(Alert).filter(Alert.created_at < (datetime.utcnow() - timedelta(days=cleanup_days))).all()
-                
-                for stat in old_stats:
-                    session.delete(stat)
-                
-                for alert in old_alerts:
-                    session.delete(alert)
+                # Single server-side DELETE each; no rows are loaded into the session
+                n_stats = session.query(DailyStats).filter(
+                    DailyStats.date < cutoff_date
+                ).delete(synchronize_session=False)
+                n_alerts = session.query(Alert).filter(
+                    Alert.created_at < (datetime.utcnow() - timedelta(days=cleanup_days))
+                ).delete(synchronize_session=False)
                 
                 session.commit()
                 
-                logger.info(f"Cleaned up {len(old_stats)} old statistics and {len(old_alerts)} old alerts")
+                logger.info(f"Cleaned up {n_stats} old statistics and {n_alerts} old alerts")
             
             # Clean old files
-            derived_dir = self.config['paths']['derived_dir']
-            if os.path.exists(derived_dir):
-                import glob
-                
+            derived_dir = self._derived_dir
+            if derived_dir and os.path.exists(derived_dir):
                 cutoff_timestamp = (datetime.utcnow() - timedelta(days=cleanup_days)).timestamp()
                 
-                for file_pattern in ['*.csv', '*.tif', '*.json']:
-                    for file_path in glob.glob(os.path.join(derived_dir, file_pattern)):
-                        if os.path.getmtime(file_path) < cutoff_timestamp:
+                # One directory scan; DirEntry caches the type and usually the stat result
+                removed_files = 0
+                with os.scandir(derived_dir) as entries:
+                    for entry in entries:
+                        if (entry.name.endswith(('.csv', '.parquet', '.tif', '.json')) and entry.is_file()
+                                and entry.stat().st_mtime < cutoff_timestamp):
                             try:
-                                os.remove(file_path)
-                                logger.info(f"Removed old file: {file_path}")
-                            except:
+                                os.remove(entry.path)
+                                removed_files += 1
+                            except OSError:
                                 pass
+                
+                logger.info(f"Removed {removed_files} old files from {derived_dir}")
             
         except Exception as e:
             logger.error(f"Cleanup failed: {e}")
@@ -349,7 +372,9 @@ class DustPipelineScheduler:
             
             if attempt < max_retries - 1:
                 logger.info(f"Waiting {retry_delay} seconds before next retry")
-                time.sleep(retry_delay)
+                if self._stop_event.wait(retry_delay):
+                    logger.info(f"Scheduler stopping, abandoning retries for {date_str}")
+                    return False
         
         logger.error(f"Pipeline failed after {max_retries} retries for {date_str}")
         return False
@@ -358,33 +383,86 @@ class DustPipelineScheduler:
         """Main scheduled job for daily processing"""
         logger.info("Starting scheduled daily job")
         
-        # Run intelligent pipeline (handles all data processing and forecasting)
-        success = self.run_daily_pipeline()
+        # One session for the job's status rows, committed at each stage boundary so a
+        # multi-hour run shows its progress and keeps what it logged if the process dies
+        success = False
+        with db_manager.get_session() as session:
+            self._job_state.session = session
+            self._job_state.pending_status = {}
+            try:
+                self.log_system_status(
+                    component='intelligent_pipeline',
+                    status='running',
+                    message='Scheduled daily job started'
+                )
+                self._commit_job_status(session)
+                
+                # Run intelligent pipeline (handles all data processing and forecasting)
+                success = self.run_daily_pipeline()
+                self._commit_job_status(session)
+                
+                if not success:
+                    # Retry if failed
+                    logger.info("Retrying intelligent pipeline...")
+                    success = self.run_daily_pipeline()
+                    self._commit_job_status(session)
+                
+                # Process alerts regardless (might have data from previous days);
+                # waits for an alert tick already in progress instead of overlapping it
+                with self._alerts_lock:
+                    self.process_alerts()
+            finally:
+                self._commit_job_status(session)
+                self._job_state.session = None
         
-        if not success:
-            # Retry if failed
-            logger.info("Retrying intelligent pipeline...")
-            success = self.run_daily_pipeline()
+        logger.info(f"Scheduled daily job completed. Success: {success}")
+    
+    def _commit_job_status(self, session):
+        """Commit the status rows a scheduled job has logged so far and remember them for dedup"""
+        try:
+            session.commit()
+            self._last_status.update(self._job_state.pending_status)
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Failed to log system status: {e}")
+        self._job_state.pending_status = {}
+    
+    def _submit_exclusive(self, job, lock: threading.Lock):
+        """Hand a scheduled job to the worker pool unless its previous run is still going"""
+        if not lock.acquire(blocking=False):
+            logger.warning(f"Skipping {job.__name__}: previous run still in progress")
+            return
         
-        # Process alerts regardless (might have data from previous days)
-        self.process_alerts()
+        def run():
+            # The future is not kept, so a job's exception is logged here or it would be lost
+            try:
+                job()
+            except Exception:
+                logger.exception(f"{job.__name__} failed")
+            finally:
+                lock.release()
         
-        logger.info(f"Scheduled daily job completed. Success: {success}")
+        self._executor.submit(run)
     
     def start_scheduler(self):
         """Start the scheduler daemon"""
         logger.info("Starting Dust Pipeline Scheduler")
         
+        # Jobs run on worker threads (one per job kind) so alert ticks keep going during a long
+        # daily pipeline; each job has its own lock so it never overlaps with its own previous run,
+        # and alert ticks share the alerts lock with the daily job's alert step
+        self._executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix='scheduler-job')
+        
         # Schedule daily pipeline
         daily_time = self.config['scheduler']['daily_run_time']
-        schedule.every().day.at(daily_time).do(self.scheduled_daily_job)
+        schedule.every().day.at(daily_time).do(self._submit_exclusive, self.scheduled_daily_job, threading.Lock())
         
         # Schedule alert processing every 10 minutes
         alert_interval = self.config['scheduler']['alert_processing_interval_minutes']
-        schedule.every(alert_interval).minutes.do(self.process_alerts)
+        schedule.every(alert_interval).minutes.do(self._submit_exclusive, self.process_alerts, self._alerts_lock)
         
         # Schedule cleanup once a week
-        schedule.every().sunday.at("02:00").do(self.cleanup_old_data)
+        schedule.every().sunday.at("02:00").do(self._submit_exclusive, self.cleanup_old_data, threading.Lock())
         
         logger.info(f"Scheduled jobs:")
         logger.info(f"  - Daily pipeline: every day at {daily_time} UTC")
@@ -393,15 +471,33 @@ class DustPipelineScheduler:
         
         # Main scheduler loop
         try:
-            while True:
+            while not self._stop_event.is_set():
                 schedule.run_pending()
-                time.sleep(60)  # Check every minute
+                # Sleep until the next job is due (capped at an hour so clock jumps are picked up)
+                idle_seconds = schedule.idle_seconds()
+                self._stop_event.wait(3600 if idle_seconds is None else min(max(idle_seconds, 1), 3600))
                 
         except KeyboardInterrupt:
+            self._stop_event.set()
             logger.info("Scheduler stopped by user")
         except Exception as e:
             logger.error(f"Scheduler error: {e}")
             raise
+        finally:
+            self._executor.shutdown(wait=False)
+            self.stop()
+    
+    def stop(self):
+        """Stop the daemon loop and shut down the alert event loop"""
+        self._stop_event.set()
+        
+        # Let an alert run in progress finish before its loop goes away
+        with self._alerts_lock:
+            if self._alert_loop.is_closed():
+                return
+            self._alert_loop.call_soon_threadsafe(self._alert_loop.stop)
+            self._alert_thread.join()
+            self._alert_loop.close()
 
 
 def main():
@@ -421,12 +517,15 @@ def main():
     
     if args.run_once:
         success = scheduler.run_daily_pipeline(args.run_once)
+        scheduler.stop()
         sys.exit(0 if success else 1)
     elif args.process_alerts:
         scheduler.process_alerts()
+        scheduler.stop()
         sys.exit(0)
     elif args.cleanup:
         scheduler.cleanup_old_data()
+        scheduler.stop()
         sys.exit(0)
     else:
         # Run as daemon
@@ -12,6 +12,28 @@ import seaborn as sns
 from pathlib import Path
 
 
+EARTH_RADIUS_KM = 6371.0
+
+# Date column names accepted in AERONET CSVs (first match wins), and the other columns loaded
+AERONET_DATE_COLUMNS = ['date', 'Date(dd:mm:yyyy)']
+AERONET_DTYPES = {
+    'station': str,
+    'latitude': 'float64',
+    'longitude': 'float64',
+    'aod_500': 'float64',
+    'aod_675': 'float64',
+    'angstrom': 'float64',
+    'data_type': str,
+}
+
+
+def haversine_vec(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Great-circle distance in km between broadcast arrays of coordinates (degrees)"""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
 class AeronetValidator:
     """AERONET validation for dust monitoring products"""
     
@@ -36,33 +58,42 @@ class AeronetValidator:
             print("No AERONET files found, creating synthetic validation data...")
             return self._create_synthetic_aeronet_data(start_date, end_date)
         
-        # Load and combine AERONET data
+        # Load and combine AERONET data (date parsing and dtypes handled by the CSV reader)
         aeronet_list = []
         for file in aeronet_files:
             try:
-                df = pd.read_csv(file)
+                header = pd.read_csv(file, nrows=0).columns
                 
                 # Standardize column names
-                if 'date' in df.columns:
-                    df['date'] = pd.to_datetime(df['date'])
-                elif 'Date(dd:mm:yyyy)' in df.columns:
-                    df['date'] = pd.to_datetime(df['Date(dd:mm:yyyy)'])
-                
-                # Filter date range
-                df = df[(df['date'] >= start_date) & (df['date'] <= end_date)]
-                
-                if len(df) > 0:
-                    aeronet_list.append(df)
+                date_col = next((c for c in AERONET_DATE_COLUMNS if c in header), None)
+                if date_col is None:
+                    raise ValueError("no date column")
+                usecols = [date_col] + [c for c in AERONET_DTYPES if c in header]
+                df = pd.read_csv(
+                    file,
+                    usecols=usecols,
+                    dtype={c: AERONET_DTYPES[c] for c in usecols[1:]},
+                    parse_dates=[date_col],
+                )
+                if not pd.api.types.is_datetime64_any_dtype(df[date_col]):
+                    raise ValueError(f"unparseable dates in column '{date_col}'")
+                aeronet_list.append(df.rename(columns={date_col: 'date'}))
                     
             except Exception as e:
                 print(f"Error loading {file}: {e}")
         
-        if aeronet_list:
-            aeronet_df = pd.concat(aeronet_list, ignore_index=True)
-            print(f"Loaded {len(aeronet_df)} AERONET observations from {len(aeronet_files)} files")
-            return aeronet_df
-        else:
+        if not aeronet_list:
             return self._create_synthetic_aeronet_data(start_date, end_date)
+        
+        # Filter date range once on the combined frame
+        aeronet_df = pd.concat(aeronet_list, ignore_index=True)
+        in_range = (aeronet_df['date'] >= start_date) & (aeronet_df['date'] <= end_date)
+        if not in_range.any():
+            return self._create_synthetic_aeronet_data(start_date, end_date)
+        
+        aeronet_df = aeronet_df[in_range].reset_index(drop=True)
+        print(f"Loaded {len(aeronet_df)} AERONET observations from {len(aeronet_files)} files")
+        return aeronet_df
     
     def _create_synthetic_aeronet_data(self, start_date: datetime, end_date: datetime) -> pd.DataFrame:
         """Create synthetic AERONET data for testing"""
@@ -78,40 +109,36 @@ class AeronetValidator:
             {"station": "SEDE_BOKER", "lat": 30.9, "lon": 34.8},
         ]
         
-        synthetic_data = []
         rng = np.random.default_rng(42)
-        
-        for date in dates:
-            for station in stations:
-                # Synthetic AOD with realistic values and some dust events
-                base_aod = 0.15 + 0.05 * np.sin((date.dayofyear - 60) * 2 * np.pi / 365)  # Seasonal
-                
-                # Add dust events (higher in spring/summer)
-                dust_prob = 0.1 if date.month in [3, 4, 5, 6, 7, 8] else 0.05
-                if rng.random() < dust_prob:
-                    dust_aod = rng.exponential(0.2)
-                    base_aod += dust_aod
-                
-                # Add noise
-                aod_noise = rng.normal(0, 0.05)
-                aod_500 = max(0.01, base_aod + aod_noise)
-                
-                # Angstrom exponent (lower for dust)
-                angstrom = 1.4 - 0.8 * (base_aod > 0.25)  # Lower for high AOD (dust)
-                angstrom += rng.normal(0, 0.2)
-                
-                synthetic_data.append({
-                    'date': date,
-                    'station': station['station'],
-                    'latitude': station['lat'],
-                    'longitude': station['lon'],
-                    'aod_500': aod_500,
-                    'aod_675': aod_500 * (675/500)**(-angstrom),
-                    'angstrom': max(0.1, angstrom),
-                    'data_type': 'synthetic'
-                })
-        
-        return pd.DataFrame(synthetic_data)
+        shape = (len(dates), len(stations))
+        
+        # Synthetic AOD with realistic values and some dust events, as (dates x stations) arrays
+        seasonal = 0.15 + 0.05 * np.sin((dates.dayofyear.to_numpy() - 60) * 2 * np.pi / 365)  # Seasonal
+        base_aod = np.broadcast_to(seasonal[:, None], shape)
+        
+        # Add dust events (higher in spring/summer)
+        dust_prob = np.where(np.isin(dates.month.to_numpy(), [3, 4, 5, 6, 7, 8]), 0.1, 0.05)
+        dust_event = rng.random(shape) < dust_prob[:, None]
+        base_aod = base_aod + np.where(dust_event, rng.exponential(0.2, shape), 0.0)
+        
+        # Add noise
+        aod_500 = np.maximum(0.01, base_aod + rng.normal(0, 0.05, shape))
+        
+        # Angstrom exponent (lower for dust)
+        angstrom = 1.4 - 0.8 * (base_aod > 0.25)  # Lower for high AOD (dust)
+        angstrom += rng.normal(0, 0.2, shape)
+        
+        n_dates = len(dates)
+        return pd.DataFrame({
+            'date': np.repeat(dates, len(stations)),
+            'station': np.tile([s['station'] for s in stations], n_dates),
+            'latitude': np.tile([s['lat'] for s in stations], n_dates),
+            'longitude': np.tile([s['lon'] for s in stations], n_dates),
+            'aod_500': aod_500.ravel(),
+            'aod_675': (aod_500 * np.power(675 / 500, -angstrom)).ravel(),
+            'angstrom': np.maximum(0.1, angstrom).ravel(),
+            'data_type': 'synthetic',
+        })
     
     def load_satellite_estimates(self, start_date: datetime, end_date: datetime) -> pd.DataFrame:
         """Load satellite AOD estimates for validation period"""
@@ -154,49 +181,52 @@ class AeronetValidator:
             'Mersin': (36.8, 34.6),
         }
         
-        matched_data = []
+        # Closest province per known station from one (stations x provinces) Haversine distance matrix
+        stations = [s for s in pd.unique(aeronet_df['station']) if s in station_coords]
+        provinces = list(province_coords)
+        station_match = pd.DataFrame(columns=['station', 'province', 'distance_km'])
+        if stations:
+            stn_lat, stn_lon = np.array([station_coords[s] for s in stations], dtype=np.float64).T
+            prov_lat, prov_lon = np.array(list(province_coords.values()), dtype=np.float64).T
+            dist_matrix = haversine_vec(stn_lat[:, None], stn_lon[:, None], prov_lat[None, :], prov_lon[None, :])
+            idx = np.argmin(dist_matrix, axis=1)
+            dist_km = dist_matrix[np.arange(len(stations)), idx]
+            within = dist_km <= max_distance_km
+            station_match = pd.DataFrame({
+                'station': [s for s, keep in zip(stations, within) if keep],
+                'province': [provinces[i] for i, keep in zip(idx, within) if keep],
+                'distance_km': dist_km[within],
+            })
+        
+        # Attach each observation to its station's province, then to the first satellite row
+        # for that date and province (inner merges keep the AERONET row order)
+        aeronet_cols = ['date', 'station', 'aod_500'] + [c for c in ['angstrom'] if c in aeronet_df.columns]
+        sat_cols = ['date', 'province_name', 'aod_mean'] + [
+            c for c in ['dust_aod_mean', 'dust_event_detected'] if c in satellite_df.columns
+        ]
+        sat_first = satellite_df[sat_cols].drop_duplicates(['date', 'province_name'])
+        matched_df = (
+            aeronet_df[aeronet_cols]
+            .merge(station_match, on='station')
+            .merge(sat_first, left_on=['date', 'province'], right_on=['date', 'province_name'])
+            .rename(columns={
+                'aod_500': 'aeronet_aod',
+                'aod_mean': 'satellite_aod',
+                'dust_aod_mean': 'satellite_dust_aod',
+                'dust_event_detected': 'dust_detected',
+            })
+        )
+        if 'satellite_dust_aod' not in matched_df.columns:
+            matched_df['satellite_dust_aod'] = 0.0
+        if 'angstrom' not in matched_df.columns:
+            matched_df['angstrom'] = np.nan
+        if 'dust_detected' not in matched_df.columns:
+            matched_df['dust_detected'] = False
+        matched_df = matched_df[[
+            'date', 'station', 'province', 'distance_km', 'aeronet_aod',
+            'satellite_aod', 'satellite_dust_aod', 'angstrom', 'dust_detected',
+        ]]
         
-        for _, aeronet_row in aeronet_df.iterrows():
-            station = aeronet_row['station']
-            aeronet_date = aeronet_row['date']
-            
-            if station in station_coords:
-                station_lat, station_lon = station_coords[station]
-                
-                # Find closest province
-                min_distance = float('inf')
-                closest_province = None
-                
-                for province, (prov_lat, prov_lon) in province_coords.items():
-                    # Simple distance calculation (approximate)
-                    distance = np.sqrt((station_lat - prov_lat)**2 + (station_lon - prov_lon)**2) * 111  # km
-                    if distance < min_distance:
-                        min_distance = distance
-                        closest_province = province
-                
-                if min_distance <= max_distance_km and closest_province:
-                    # Find satellite data for same date and province
-                    sat_match = satellite_df[
-                        (satellite_df['date'] == aeronet_date) & 
-                        (satellite_df['province_name'] == closest_province)
-                    ]
-                    
-                    if len(sat_match) > 0:
-                        sat_row = sat_match.iloc[0]
-                        
-                        matched_data.append({
-                            'date': aeronet_date,
-                            'station': station,
-                            'province': closest_province,
-                            'distance_km': min_distance,
-                            'aeronet_aod': aeronet_row['aod_500'],
-                            'satellite_aod': sat_row['aod_mean'],
-                            'satellite_dust_aod': sat_row.get('dust_aod_mean', 0.0),
-                            'angstrom': aeronet_row.get('angstrom', np.nan),
-                            'dust_detected': sat_row.get('dust_event_detected', False),
-                        })
-        
-        matched_df = pd.DataFrame(matched_data)
         print(f"Matched {len(matched_df)} AERONET-satellite pairs")
         return matched_df
     
@@ -47,7 +47,8 @@ def _get_province_id_mapping() -> dict:
     return mapping
 
 
-def compute_meteo_stats(utc_date: datetime, rh_raster: str, blh_raster: str, params: dict) -> str:
+def compute_meteo_stats(utc_date: datetime, era5_raster: str, params: dict) -> str:
+    """Province means of the 2-band ERA5 raster (band 1: RH, band 2: BLH)"""
     provinces = _load_provinces(params)
     province_mapping = _get_province_id_mapping()
     out_csv = os.path.join(
@@ -55,20 +56,18 @@ def compute_meteo_stats(utc_date: datetime, rh_raster: str, blh_raster: str, par
         f"meteo_stats_{utc_date.date().isoformat()}.csv",
     )
 
-    with rasterio.open(rh_raster) as rh_ds, rasterio.open(blh_raster) as blh_ds:
-        if rh_ds.transform != blh_ds.transform or rh_ds.width != blh_ds.width or rh_ds.height != blh_ds.height:
-            raise ValueError("RH and BLH rasters are not aligned in this MVP stub")
-        rh = rh_ds.read(1)
-        blh = blh_ds.read(1)
+    with rasterio.open(era5_raster) as era5_ds:
+        rh = era5_ds.read(1)
+        blh = era5_ds.read(2)
 
         rows = []
         for idx, row in provinces.iterrows():
             geom = row.geometry
             mask = geometry_mask(
                 [geom.__geo_interface__],
-                transform=rh_ds.transform,
+                transform=era5_ds.transform,
                 invert=True,
-                out_shape=(rh_ds.height, rh_ds.width),
+                out_shape=(era5_ds.height, era5_ds.width),
             )
             vals_rh = rh[mask]
             vals_blh = blh[mask]